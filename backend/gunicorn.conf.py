@@ -0,0 +1,19 @@
+# Multi-worker deployment profile: gunicorn -c gunicorn.conf.py server:app
+#
+# Each worker imports server.py and builds its own Mongo and HTTP clients on
+# startup, after the fork. Pool sizes and the DataForSEO rate limit are split
+# across WEB_CONCURRENCY workers; SERP, keyword and AI results are shared
+# between workers through the Mongo-backed cache.
+import multiprocessing
+import os
+
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+
+# Never build Motor clients in the master: they are not fork-safe
+preload_app = False
+
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
@@ -1,28 +1,76 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, OperationFailure
 import os
+import io
+import re
+import csv
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, EmailStr, ValidationError
+from typing import List, Optional, Tuple
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import bcrypt
 import httpx
 import base64
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import orjson
+import asyncio
+import random
+import time
+import hashlib
+import zlib
+import brotli
+from cachetools import TTLCache
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Worker processes sharing this host (gunicorn/uvicorn --workers), used to split pools and rate limits
+WORKER_COUNT = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+
+# MongoDB connection, created per worker on startup (after fork)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Total connections this host may open, split evenly across workers
+MONGO_POOL_BUDGET = int(os.environ.get('MONGO_POOL_BUDGET', '100'))
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', str(max(10, MONGO_POOL_BUDGET // WORKER_COUNT))))
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+# Shared cache TTLs in seconds
+SERP_CACHE_TTL = int(os.environ.get('SERP_CACHE_TTL', str(24 * 3600)))
+KEYWORD_CACHE_TTL = int(os.environ.get('KEYWORD_CACHE_TTL', str(24 * 3600)))
+AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', str(7 * 24 * 3600)))
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '60'))
+# Competitor domain rank/backlinks are refreshed after this many seconds
+DOMAIN_METRICS_TTL = int(os.environ.get('DOMAIN_METRICS_TTL', str(30 * 24 * 3600)))
+# Keyword clusters whose SERPs share at least this fraction of top-10 domains are merged
+CLUSTER_SERP_OVERLAP = float(os.environ.get('CLUSTER_SERP_OVERLAP', '0.6'))
+CLUSTER_ALIAS_TTL = int(os.environ.get('CLUSTER_ALIAS_TTL', str(30 * 24 * 3600)))
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+# Keyword metrics younger than this are served from keyword_metrics instead of DataForSEO
+KEYWORD_METRICS_MAX_AGE_DAYS = int(os.environ.get('KEYWORD_METRICS_MAX_AGE_DAYS', '30'))
+
+# Domain availability checks
+DOMAIN_RESOLVER = os.environ.get('DOMAIN_RESOLVER', 'dns')  # "dns" (DNS NS + RDAP) or "stub"
+DOMAIN_STUB_REGISTERED = [d.strip().lower() for d in os.environ.get('DOMAIN_STUB_REGISTERED', '').split(',') if d.strip()]
+DOMAIN_RDAP_URL = os.environ.get('DOMAIN_RDAP_URL', 'https://rdap.org/domain/')
+DOMAIN_CHECK_CONCURRENCY = int(os.environ.get('DOMAIN_CHECK_CONCURRENCY', '50'))
+DOMAIN_REGISTERED_TTL = int(os.environ.get('DOMAIN_REGISTERED_TTL', str(7 * 24 * 3600)))
+DOMAIN_AVAILABLE_TTL = int(os.environ.get('DOMAIN_AVAILABLE_TTL', '3600'))
 
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'emd-hunter-secret-key-2025')
@@ -32,13 +80,40 @@ JWT_EXPIRATION_HOURS = 24
 # DataForSEO Config
 DATAFORSEO_LOGIN = os.environ.get('DATAFORSEO_LOGIN', '')
 DATAFORSEO_PASSWORD = os.environ.get('DATAFORSEO_PASSWORD', '')
+DATAFORSEO_BASE_URL = "https://api.dataforseo.com/v3"
+# Live endpoints are limited to 2000 calls/minute per account; stay under it.
+# The rate is per host, each worker gets an equal share.
+DATAFORSEO_RATE_PER_SEC = float(os.environ.get('DATAFORSEO_RATE_PER_SEC', '25')) / WORKER_COUNT
+DATAFORSEO_BURST = int(os.environ.get('DATAFORSEO_BURST', '10'))
+DATAFORSEO_MAX_RETRIES = int(os.environ.get('DATAFORSEO_MAX_RETRIES', '4'))
+# Spend caps in USD, 0 disables the cap
+DATAFORSEO_DAILY_BUDGET = float(os.environ.get('DATAFORSEO_DAILY_BUDGET', '0'))
+DATAFORSEO_USER_DAILY_BUDGET = float(os.environ.get('DATAFORSEO_USER_DAILY_BUDGET', '0'))
+
+# Fair-share scheduling of upstream-bound requests, per worker
+SCHEDULER_SLOTS = int(os.environ.get('SCHEDULER_SLOTS', '16'))
+SCHEDULER_USER_SLOTS = int(os.environ.get('SCHEDULER_USER_SLOTS', '4'))
+# Batch work may use at most this share of the slots; the rest stays free for interactive checks
+SCHEDULER_BATCH_SHARE = float(os.environ.get('SCHEDULER_BATCH_SHARE', '0.75'))
+SCHEDULER_INTERACTIVE_WEIGHT = int(os.environ.get('SCHEDULER_INTERACTIVE_WEIGHT', '4'))
+SCHEDULER_MAX_WAIT = float(os.environ.get('SCHEDULER_MAX_WAIT', '30'))
+SCHEDULER_MAX_QUEUED = int(os.environ.get('SCHEDULER_MAX_QUEUED', '50'))
+# Requests per user per UTC day, 0 disables the quota
+QUOTA_DAILY_LIMITS = {
+    "serp": int(os.environ.get('QUOTA_SERP_DAILY', '1000')),
+    "keywords": int(os.environ.get('QUOTA_KEYWORDS_DAILY', '300')),
+    "ai": int(os.environ.get('QUOTA_AI_DAILY', '100')),
+}
+
+# Live updates: "auto" uses change streams when Mongo is a replica set, else in-process delivery
+EVENTS_MODE = os.environ.get('EVENTS_MODE', 'auto')  # "auto", "change_stream" or "local"
+EVENTS_TTL = int(os.environ.get('EVENTS_TTL', '3600'))
+EVENTS_MAX_INLINE_DOCS = int(os.environ.get('EVENTS_MAX_INLINE_DOCS', '50'))
+WS_PING_INTERVAL = float(os.environ.get('WS_PING_INTERVAL', '25'))
 
 # Emergent LLM Key
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY', '')
 
-# Create the main app
-app = FastAPI(title="EMD Hunter API")
-
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
@@ -125,6 +200,110 @@ class OpportunityResponse(BaseModel):
     created_at: str
     user_id: str
 
+# ============== INTERNAL RECORDS ==============
+# Compact rows used on the hot paths (SERP parsing, keyword filtering, scoring).
+# They become plain dicts only at the edge: API responses, cache and Mongo writes.
+
+@dataclass(slots=True)
+class SerpRow:
+    rank: int
+    domain: str
+    url: str
+    title: str
+    description: str
+    domain_rank: int
+    backlinks: int
+    is_directory: bool
+    is_replaceable: bool
+
+    @classmethod
+    def from_upstream(cls, item: dict) -> "SerpRow":
+        """Build from an organic item of /serp/google/organic/live/advanced."""
+        url = item.get("url") or ""
+        domain = extract_domain(url)
+        domain_lower = domain.lower()
+        is_directory = any(d in domain_lower for d in SERP_DIRECTORY_DOMAINS)
+        rank_info = item.get("rank_info")
+        main_domain_rank = rank_info.get("main_domain_rank") if rank_info else None
+        backlinks_info = item.get("backlinks_info")
+        return cls(
+            item.get("rank_absolute", 0),
+            domain,
+            url,
+            item.get("title") or "",
+            item.get("description") or "",
+            main_domain_rank or 0,
+            (backlinks_info.get("backlinks") or 0) if backlinks_info else 0,
+            is_directory,
+            is_directory or (main_domain_rank or 100) < 40
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SerpRow":
+        """Build from a row we serialized earlier (cache, saved opportunity, client payload)."""
+        return cls(
+            data.get("rank") or 0,
+            data.get("domain") or "",
+            data.get("url") or "",
+            data.get("title") or "",
+            data.get("description") or "",
+            data.get("domain_rank") or 0,
+            data.get("backlinks") or 0,
+            bool(data.get("is_directory")),
+            bool(data.get("is_replaceable"))
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "rank": self.rank,
+            "domain": self.domain,
+            "url": self.url,
+            "title": self.title,
+            "description": self.description,
+            "domain_rank": self.domain_rank,
+            "backlinks": self.backlinks,
+            "is_directory": self.is_directory,
+            "is_replaceable": self.is_replaceable
+        }
+
+@dataclass(slots=True)
+class KeywordRow:
+    keyword: str
+    search_volume: int
+    cpc: float
+    competition: float
+    advertiser_competition: Optional[float] = None
+
+    @classmethod
+    def from_upstream(cls, item: dict) -> "KeywordRow":
+        """Build from a Google Ads keywords_data result item."""
+        return cls(
+            item.get("keyword") or "",
+            item.get("search_volume") or 0,
+            item.get("cpc") or 0,
+            item.get("competition") or 0,
+            item.get("competition_index", 0)
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KeywordRow":
+        return cls(
+            data.get("keyword") or "",
+            data.get("search_volume") or 0,
+            data.get("cpc") or 0,
+            data.get("competition") or 0,
+            data.get("advertiser_competition")
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "keyword": self.keyword,
+            "search_volume": self.search_volume,
+            "cpc": self.cpc,
+            "competition": self.competition,
+            "advertiser_competition": self.advertiser_competition
+        }
+
 # ============== HELPER FUNCTIONS ==============
 
 def hash_password(password: str) -> str:
@@ -141,55 +320,59 @@ def create_token(user_id: str, email: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def user_from_token(token: str) -> dict:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+            if not user:
+                raise HTTPException(status_code=401, detail="User not found")
+            user_cache[user_id] = user
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-def calculate_kill_score(serp_results: List[dict], keyword_data: dict) -> int:
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await user_from_token(credentials.credentials)
+
+# Directory sites (Yelp, BBB, Angi, etc.) - easy to replace
+KILL_SCORE_DIRECTORY_DOMAINS = ('yelp.com', 'bbb.org', 'angieslist.com', 'angi.com', 'yellowpages.com',
+                                'thumbtack.com', 'homeadvisor.com', 'houzz.com', 'manta.com')
+
+def calculate_kill_score(serp_results: List[SerpRow], keyword_data: dict) -> int:
     """Calculate Kill Score (0-100) based on SERP weakness indicators."""
     score = 0
     
-    # Directory sites (Yelp, BBB, Angi, etc.) - easy to replace
-    directory_domains = ['yelp.com', 'bbb.org', 'angieslist.com', 'angi.com', 'yellowpages.com', 
-                         'thumbtack.com', 'homeadvisor.com', 'houzz.com', 'manta.com']
-    
     replaceable_count = 0
     weak_competitors = 0
+    keyword = (keyword_data.get('keyword') or '').lower()
     
     for result in serp_results[:10]:
-        domain = result.get('domain', '').lower()
+        domain = result.domain.lower()
         
         # Check for directory sites
-        if any(dir_domain in domain for dir_domain in directory_domains):
+        if any(dir_domain in domain for dir_domain in KILL_SCORE_DIRECTORY_DOMAINS):
             replaceable_count += 1
             continue
         
         # Check domain authority (if available)
-        domain_rank = result.get('domain_rank', 0)
+        domain_rank = result.domain_rank
         if domain_rank and domain_rank < 40:
             weak_competitors += 1
         
         # Check backlinks
-        backlinks = result.get('backlinks', 0)
+        backlinks = result.backlinks
         if backlinks and backlinks < 50:
             weak_competitors += 1
         
         # Check if title contains exact keyword
-        title = result.get('title', '').lower()
-        keyword = keyword_data.get('keyword', '').lower()
-        if keyword and keyword not in title:
+        if keyword and keyword not in result.title.lower():
             replaceable_count += 1
     
     # Calculate score components
@@ -219,6 +402,621 @@ def calculate_kill_score(serp_results: List[dict], keyword_data: dict) -> int:
     
     return min(score, 100)
 
+# ============== SHARED CACHE ==============
+
+class SharedCache:
+    """Two-tier cache: a small per-worker TTL dict in front of a Mongo collection.
+    
+    The Mongo tier is shared by every worker process, so a SERP or AI result
+    paid for by one worker is served by all of them. Expiry is enforced by a
+    TTL index on `expires_at` and re-checked on read.
+    """
+
+    def __init__(self, collection_name: str = "cache", local_size: int = 2048, local_ttl: float = 60.0):
+        self.collection_name = collection_name
+        self.local = TTLCache(maxsize=local_size, ttl=local_ttl)
+
+    @staticmethod
+    def make_key(namespace: str, *parts) -> str:
+        digest = hashlib.sha1(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return f"{namespace}:{digest}"
+
+    async def get(self, key: str):
+        if key in self.local:
+            return self.local[key]
+        doc = await db[self.collection_name].find_one({"_id": key}, {"value": 1, "expires_at": 1})
+        if not doc or doc["expires_at"].replace(tzinfo=timezone.utc) <= datetime.now(timezone.utc):
+            return None
+        self.local[key] = doc["value"]
+        return doc["value"]
+
+    async def set(self, key: str, value, ttl: int):
+        self.local[key] = value
+        await db[self.collection_name].update_one(
+            {"_id": key},
+            {"$set": {"value": value, "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+
+    async def get_many(self, keys: List[str]) -> dict:
+        """Look up many keys with a single Mongo round trip for the local misses."""
+        found = {key: self.local[key] for key in keys if key in self.local}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            now = datetime.now(timezone.utc)
+            async for doc in db[self.collection_name].find({"_id": {"$in": missing}}, {"value": 1, "expires_at": 1}):
+                if doc["expires_at"].replace(tzinfo=timezone.utc) > now:
+                    self.local[doc["_id"]] = doc["value"]
+                    found[doc["_id"]] = doc["value"]
+        return found
+
+    async def set_many(self, entries: List[tuple]):
+        """Store (key, value, ttl) entries with one bulk_write."""
+        if not entries:
+            return
+        now = datetime.now(timezone.utc)
+        operations = []
+        for key, value, ttl in entries:
+            self.local[key] = value
+            operations.append(UpdateOne(
+                {"_id": key},
+                {"$set": {"value": value, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True
+            ))
+        await db[self.collection_name].bulk_write(operations, ordered=False)
+
+    async def delete(self, key: str):
+        self.local.pop(key, None)
+        await db[self.collection_name].delete_one({"_id": key})
+
+shared_cache = SharedCache()
+# Users never change after registration, so a short per-worker TTL is enough
+user_cache = TTLCache(maxsize=4096, ttl=USER_CACHE_TTL)
+
+def connect_db():
+    """Build the Mongo client for this worker; called on startup so each process owns its pool."""
+    global client, db
+    client = AsyncIOMotorClient(mongo_url, maxPoolSize=MONGO_MAX_POOL_SIZE)
+    db = client[os.environ['DB_NAME']]
+
+async def ensure_indexes():
+    try:
+        await asyncio.gather(
+            db.cache.create_index("expires_at", expireAfterSeconds=0),
+            db.users.create_index("email"),
+            db.users.create_index("id"),
+            db.opportunities.create_index([("user_id", 1), ("created_at", -1)]),
+            db.opportunities.create_index([("user_id", 1), ("kill_score", -1)]),
+            db.opportunities.create_index("id"),
+            db.api_usage.create_index([("user_id", 1), ("date", 1)], unique=True),
+            db.quotas.create_index([("user_id", 1), ("date", 1)], unique=True),
+            db.keyword_metrics.create_index([("keyword", 1), ("location", 1), ("month", 1)], unique=True),
+            db.keyword_metrics.create_index([("location", 1), ("last.date", -1)]),
+            db.stats.create_index("user_id", unique=True),
+            db.domain_metrics.create_index("domain", unique=True),
+            db.domain_metrics.create_index("fetched_at", expireAfterSeconds=DOMAIN_METRICS_TTL),
+            db.events.create_index("created_at", expireAfterSeconds=EVENTS_TTL),
+        )
+    except Exception as e:
+        logger.error(f"Index creation failed: {str(e)}")
+
+# ============== HTTP CACHING & COMPRESSION ==============
+
+class CompressionMiddleware:
+    """Brotli or gzip response compression, chosen from Accept-Encoding.
+    
+    Bodies under `minimum_size` go out as-is. Streamed bodies are compressed
+    chunk by chunk with a sync flush so exports and event streams stay live.
+    """
+
+    SKIP_CONTENT_TYPES = ("text/event-stream", "application/vnd.apache.parquet", "image/")
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        encoding = "br" if "br" in accept else "gzip" if "gzip" in accept else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        compressor = None
+        
+        def compress(data: bytes, final: bool) -> bytes:
+            if encoding == "br":
+                out = compressor.process(data)
+                return out + (compressor.finish() if final else compressor.flush())
+            out = compressor.compress(data)
+            return out + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                content_type = headers.get("content-type", "")
+                skip = (
+                    "content-encoding" in headers
+                    or start_message["status"] in (204, 304)
+                    or content_type.startswith(self.SKIP_CONTENT_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                )
+                if not skip:
+                    compressor = (
+                        brotli.Compressor(quality=self.brotli_quality) if encoding == "br"
+                        else zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+                    )
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if "content-length" in headers:
+                        del headers["content-length"]
+                await send(start_message)
+                start_message = None
+            
+            if compressor is not None:
+                message = {**message, "body": compress(body, not more_body)}
+            await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+
+def content_etag(payload) -> str:
+    # Weak: CompressionMiddleware serves the same content as brotli, gzip or identity bytes
+    return f'W/"{hashlib.sha1(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()[:20]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # Always revalidate; a matching ETag turns the reload into an empty 304
+    response.headers["Cache-Control"] = "private, no-cache"
+
+async def get_data_version(user_id: str) -> int:
+    """Per-user counter bumped by every opportunity write (kept on the stats document)."""
+    stats = await db.stats.find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+    return (stats or {}).get("version", 0)
+
+# ============== UPSTREAM GOVERNOR ==============
+
+class UpstreamError(Exception):
+    """Raised when DataForSEO cannot serve a request (throttled, failing or over budget)."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+class TokenBucket:
+    """Async token bucket whose refill rate adapts to upstream throttling (AIMD)."""
+
+    def __init__(self, rate: float, capacity: int, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self):
+        # Multiplicative decrease when upstream tells us to slow down
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+
+    def succeeded(self):
+        # Additive increase back towards the configured rate
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after a cooldown."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+class UpstreamGovernor:
+    """Throttles, retries and accounts for every DataForSEO call."""
+
+    RETRYABLE_HTTP_STATUS = {429, 500, 502, 503, 504}
+    # 40202/40209: rate and concurrency limits, 50000/50301: internal errors
+    RETRYABLE_API_STATUS = {40202, 40209, 50000, 50301}
+    THROTTLE_STATUS = {429, 40202, 40209}
+
+    def __init__(self, rate: float, burst: int, max_retries: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self.http_client is None or self.http_client.is_closed:
+            auth_string = base64.b64encode(f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}".encode()).decode()
+            self.http_client = httpx.AsyncClient(
+                base_url=DATAFORSEO_BASE_URL,
+                headers={
+                    "Authorization": f"Basic {auth_string}",
+                    "Content-Type": "application/json"
+                },
+                timeout=60.0
+            )
+        return self.http_client
+
+    async def close(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+    async def check_budget(self, user_id: str):
+        today = datetime.now(timezone.utc).date().isoformat()
+        if DATAFORSEO_USER_DAILY_BUDGET:
+            usage = await db.api_usage.find_one({"user_id": user_id, "date": today}, {"_id": 0, "cost": 1})
+            if usage and usage.get("cost", 0) >= DATAFORSEO_USER_DAILY_BUDGET:
+                raise UpstreamError("Daily DataForSEO budget reached for this account", status_code=429)
+        if DATAFORSEO_DAILY_BUDGET:
+            usage = await db.api_usage.find_one({"user_id": "*", "date": today}, {"_id": 0, "cost": 1})
+            if usage and usage.get("cost", 0) >= DATAFORSEO_DAILY_BUDGET:
+                raise UpstreamError("Daily DataForSEO budget reached", status_code=429)
+
+    async def record_spend(self, user_id: str, endpoint: str, cost: float):
+        today = datetime.now(timezone.utc).date().isoformat()
+        update = {
+            "$inc": {"cost": cost, "requests": 1, f"endpoints.{endpoint.replace('/', '_')}": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+        # One document per user per day, plus a "*" document for the global total
+        for owner in (user_id, "*"):
+            await db.api_usage.update_one({"user_id": owner, "date": today}, update, upsert=True)
+
+    async def post(self, endpoint: str, payload: List[dict], user_id: str) -> dict:
+        """POST to a DataForSEO endpoint and return the decoded body, or raise UpstreamError."""
+        await self.check_budget(user_id)
+
+        last_error = "DataForSEO request failed"
+        for attempt in range(self.max_retries + 1):
+            is_probe = self.breaker.state == "half_open"
+            if not self.breaker.allow():
+                raise UpstreamError("DataForSEO is temporarily unavailable, please retry shortly")
+
+            retry_status = None
+            try:
+                await self.bucket.acquire()
+                try:
+                    response = await self._client().post(endpoint, json=payload)
+                    if response.status_code in self.RETRYABLE_HTTP_STATUS:
+                        retry_status = response.status_code
+                        last_error = f"DataForSEO HTTP {response.status_code}"
+                    else:
+                        try:
+                            data = orjson.loads(response.content)
+                        except orjson.JSONDecodeError:
+                            # Auth failures and proxy errors come back as HTML; retrying won't help
+                            self.breaker.record_failure()
+                            raise UpstreamError(f"DataForSEO HTTP {response.status_code}: response was not JSON", status_code=502)
+                        api_status = data.get("status_code")
+                        if api_status in self.RETRYABLE_API_STATUS:
+                            retry_status = api_status
+                            last_error = f"DataForSEO {api_status}: {data.get('status_message', '')}"
+                        else:
+                            self.breaker.record_success()
+                            self.bucket.succeeded()
+                            await self.record_spend(user_id, endpoint, data.get("cost", 0) or 0)
+                            if api_status != 20000:
+                                raise UpstreamError(
+                                    f"DataForSEO {api_status}: {data.get('status_message', 'request rejected')}",
+                                    status_code=502
+                                )
+                            return data
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = f"DataForSEO transport error: {str(e)}"
+
+                self.breaker.record_failure()
+            finally:
+                # Whatever happened (including cancellation), the half-open probe is over
+                if is_probe:
+                    self.breaker.probing = False
+            if retry_status in self.THROTTLE_STATUS:
+                self.bucket.throttled()
+            if attempt < self.max_retries:
+                # Full jitter exponential backoff: 0.5s, 1s, 2s, 4s... capped at 20s
+                delay = random.uniform(0, min(20.0, 0.5 * 2 ** attempt))
+                logger.warning(f"{last_error}, retrying {endpoint} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+        raise UpstreamError(last_error)
+
+dataforseo = UpstreamGovernor(DATAFORSEO_RATE_PER_SEC, DATAFORSEO_BURST, DATAFORSEO_MAX_RETRIES)
+
+# ============== FAIR-SHARE SCHEDULING ==============
+
+class SchedulerError(Exception):
+    """Raised when a user is over quota or cannot get a scheduler slot in time."""
+
+    def __init__(self, message: str, status_code: int = 429, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def to_http(self) -> HTTPException:
+        headers = {"Retry-After": str(self.retry_after)} if self.retry_after else None
+        return HTTPException(status_code=self.status_code, detail=self.message, headers=headers)
+
+@dataclass(slots=True)
+class SlotTicket:
+    user_id: str
+    priority: str
+    enqueued_at: float
+    future: asyncio.Future
+    position: int = 0
+    waited: float = 0.0
+
+class FairShareScheduler:
+    """Per-worker admission control for the upstream-bound endpoints.
+    
+    Each user may hold at most `per_user` slots. Free slots go to the waiting
+    priority classes by weighted round robin (interactive before batch, 4:1
+    by default), and to users round robin within a class, so one user's
+    sweep cannot starve everyone else. Batch work never takes more than
+    `batch_slots`, which keeps room for interactive checks.
+    """
+
+    def __init__(self, slots: int, per_user: int, batch_slots: int, weights: dict, max_wait: float, max_queued: int):
+        self.slots = slots
+        self.per_user = per_user
+        self.class_limits = {"interactive": slots, "batch": batch_slots}
+        self.weights = weights
+        self.credits = dict(weights)
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        # priority -> user_id -> FIFO of waiting tickets; dict order is the round robin
+        self.queues = {priority: {} for priority in weights}
+        self.running = {}
+        self.active = {priority: 0 for priority in weights}
+        self.avg_wait = {priority: 0.0 for priority in weights}
+
+    def queued(self, user_id: Optional[str] = None) -> int:
+        return sum(
+            len(tickets)
+            for queue in self.queues.values()
+            for owner, tickets in queue.items()
+            if user_id is None or owner == user_id
+        )
+
+    async def acquire(self, user_id: str, priority: str = "interactive") -> SlotTicket:
+        if self.queued(user_id) >= self.max_queued:
+            raise SchedulerError("Too many queued requests, please wait for earlier ones to finish", retry_after=5)
+        ticket = SlotTicket(user_id, priority, time.monotonic(), asyncio.get_running_loop().create_future())
+        ticket.position = self.queued() + 1
+        self.queues[priority].setdefault(user_id, []).append(ticket)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.future.done():
+                # Granted while we were giving up: hand the slot back
+                self.release(ticket)
+            else:
+                ticket.future.cancel()
+                self._discard(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                raise SchedulerError("Server is busy, please retry shortly", status_code=503, retry_after=int(self.max_wait))
+            raise
+        ticket.waited = time.monotonic() - ticket.enqueued_at
+        self.avg_wait[priority] = 0.8 * self.avg_wait[priority] + 0.2 * ticket.waited
+        return ticket
+
+    def release(self, ticket: SlotTicket):
+        self.active[ticket.priority] -= 1
+        self.running[ticket.user_id] -= 1
+        if not self.running[ticket.user_id]:
+            del self.running[ticket.user_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: str = "interactive"):
+        ticket = await self.acquire(user_id, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _discard(self, ticket: SlotTicket):
+        tickets = self.queues[ticket.priority].get(ticket.user_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.queues[ticket.priority][ticket.user_id]
+
+    def _dispatch(self):
+        while sum(self.active.values()) < self.slots:
+            ticket = self._next()
+            if ticket is None:
+                return
+            self.active[ticket.priority] += 1
+            self.running[ticket.user_id] = self.running.get(ticket.user_id, 0) + 1
+            ticket.future.set_result(None)
+
+    def _next(self) -> Optional[SlotTicket]:
+        # Classes with credit left go first; once every eligible class is spent, refill
+        for refill in (False, True):
+            if refill:
+                self.credits = dict(self.weights)
+            for priority in sorted(self.queues, key=lambda p: -self.credits[p]):
+                if self.credits[priority] <= 0 or self.active[priority] >= self.class_limits[priority]:
+                    continue
+                queue = self.queues[priority]
+                for user_id in list(queue):
+                    if self.running.get(user_id, 0) >= self.per_user:
+                        continue
+                    tickets = queue.pop(user_id)
+                    ticket = tickets.pop(0)
+                    if tickets:
+                        # Re-append so the next grant in this class goes to another user
+                        queue[user_id] = tickets
+                    self.credits[priority] -= 1
+                    return ticket
+        return None
+
+    def status(self, user_id: str) -> dict:
+        waiting = sorted(
+            (ticket for queue in self.queues.values() for tickets in queue.values() for ticket in tickets),
+            key=lambda ticket: ticket.enqueued_at
+        )
+        now = time.monotonic()
+        return {
+            "slots": self.slots,
+            "active": sum(self.active.values()),
+            "queued": len(waiting),
+            "per_user_limit": self.per_user,
+            "running": self.running.get(user_id, 0),
+            "waiting": [
+                {"priority": ticket.priority, "position": position, "waited_ms": int((now - ticket.enqueued_at) * 1000)}
+                for position, ticket in enumerate(waiting, 1)
+                if ticket.user_id == user_id
+            ],
+            "avg_wait_ms": {priority: int(wait * 1000) for priority, wait in self.avg_wait.items()}
+        }
+
+scheduler = FairShareScheduler(
+    SCHEDULER_SLOTS,
+    SCHEDULER_USER_SLOTS,
+    max(1, int(SCHEDULER_SLOTS * SCHEDULER_BATCH_SHARE)),
+    {"interactive": SCHEDULER_INTERACTIVE_WEIGHT, "batch": 1},
+    SCHEDULER_MAX_WAIT,
+    SCHEDULER_MAX_QUEUED
+)
+
+def seconds_until_utc_midnight() -> int:
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((midnight - now).total_seconds()) + 1
+
+async def charge_quota(user_id: str, kind: str, amount: int = 1) -> int:
+    """Count `amount` requests of `kind` against today's quota with one atomic $inc; roll back and raise when over."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    doc = await db.quotas.find_one_and_update(
+        {"user_id": user_id, "date": today},
+        {"$inc": {f"counts.{kind}": amount}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "counts": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    used = doc["counts"][kind]
+    limit = QUOTA_DAILY_LIMITS.get(kind)
+    if limit and used > limit:
+        await db.quotas.update_one({"user_id": user_id, "date": today}, {"$inc": {f"counts.{kind}": -amount}})
+        raise SchedulerError(
+            f"Daily {kind} quota of {limit} requests reached",
+            retry_after=seconds_until_utc_midnight()
+        )
+    return used
+
+async def enforce_quota(user_id: str, kind: str, amount: int = 1):
+    try:
+        await charge_quota(user_id, kind, amount)
+    except SchedulerError as e:
+        raise e.to_http()
+
+def fair_share(priority: str = "interactive"):
+    """Dependency for upstream-bound endpoints: hold a scheduler slot while the endpoint runs.
+    
+    Resolves to the current user. The time spent queued is reported in
+    X-Queue-Wait-Ms. Quotas are charged by the endpoint itself, since
+    dependencies run before the request body is validated.
+    """
+    async def dependency(response: Response, current_user: dict = Depends(get_current_user)):
+        try:
+            ticket = await scheduler.acquire(current_user["id"], priority)
+        except SchedulerError as e:
+            raise e.to_http()
+        response.headers["X-Queue-Position"] = str(ticket.position)
+        response.headers["X-Queue-Wait-Ms"] = str(int(ticket.waited * 1000))
+        try:
+            yield current_user
+        finally:
+            scheduler.release(ticket)
+    return dependency
+
+@api_router.get("/quota")
+async def get_quota(current_user: dict = Depends(get_current_user)):
+    """Today's request counts and limits, plus this worker's queue state for the current user."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    doc = await db.quotas.find_one({"user_id": current_user["id"], "date": today}, {"_id": 0, "counts": 1})
+    return {
+        "date": today,
+        "used": (doc or {}).get("counts", {}),
+        "limits": {kind: limit or None for kind, limit in QUOTA_DAILY_LIMITS.items()},
+        "resets_in": seconds_until_utc_midnight(),
+        "scheduler": scheduler.status(current_user["id"])
+    }
+
 # ============== AUTH ENDPOINTS ==============
 
 @api_router.post("/auth/register", response_model=TokenResponse)
@@ -277,78 +1075,69 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 # ============== DATAFORSEO ENDPOINTS ==============
 
 @api_router.post("/keywords/search")
-async def search_keywords(request: KeywordSearchRequest, current_user: dict = Depends(get_current_user)):
+async def search_keywords(request: KeywordSearchRequest, current_user: dict = Depends(fair_share())):
     """Search for keywords using DataForSEO API."""
+    await enforce_quota(current_user["id"], "keywords")
     if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
         # Return mock data if no API credentials
         mock_data = generate_mock_keywords(request.seed_keyword, request.min_volume, request.max_volume, request.min_cpc, request.limit)
         return {"keywords": mock_data, "source": "mock"}
     
-    try:
-        auth_string = base64.b64encode(f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}".encode()).decode()
-        
-        async with httpx.AsyncClient() as client_http:
+    cache_key = SharedCache.make_key(
+        "keywords", request.seed_keyword.strip().lower(), request.location_name, request.language_name
+    )
+    items = await shared_cache.get(cache_key)
+    source = "cache" if items is not None else "dataforseo"
+    if items is None:
+        try:
             # Use Keywords For Site endpoint for related keywords
-            response = await client_http.post(
-                "https://api.dataforseo.com/v3/keywords_data/google_ads/keywords_for_site/live",
-                headers={
-                    "Authorization": f"Basic {auth_string}",
-                    "Content-Type": "application/json"
-                },
-                json=[{
+            data = await dataforseo.post(
+                "/keywords_data/google_ads/keywords_for_site/live",
+                [{
                     "target": request.seed_keyword,
                     "location_name": request.location_name,
                     "language_name": request.language_name,
                     "search_partners": False,
                     "sort_by": "search_volume"
                 }],
-                timeout=60.0
+                current_user["id"]
             )
-            
-            data = response.json()
-            
-            if data.get("status_code") != 20000:
-                # Fallback to mock data
-                mock_data = generate_mock_keywords(request.seed_keyword, request.min_volume, request.max_volume, request.min_cpc, request.limit)
-                return {"keywords": mock_data, "source": "mock"}
-            
-            keywords = []
-            tasks = data.get("tasks", [])
-            for task in tasks:
-                result = task.get("result", [])
-                for item in result:
-                    sv = item.get("search_volume", 0) or 0
-                    cpc_val = item.get("cpc", 0) or 0
-                    comp = item.get("competition", 0) or 0
-                    
-                    # Apply filters
-                    if sv < request.min_volume or sv > request.max_volume:
-                        continue
-                    if cpc_val < request.min_cpc:
-                        continue
-                    if request.max_cpc and cpc_val > request.max_cpc:
-                        continue
-                    
-                    keywords.append({
-                        "keyword": item.get("keyword", ""),
-                        "search_volume": sv,
-                        "cpc": cpc_val,
-                        "competition": comp,
-                        "advertiser_competition": item.get("competition_index", 0)
-                    })
-            
-            keywords = keywords[:request.limit]
-            return {"keywords": keywords, "source": "dataforseo"}
-            
-    except Exception as e:
-        logger.error(f"DataForSEO error: {str(e)}")
-        mock_data = generate_mock_keywords(request.seed_keyword, request.min_volume, request.max_volume, request.min_cpc, request.limit)
-        return {"keywords": mock_data, "source": "mock"}
+        except UpstreamError as e:
+            logger.error(f"DataForSEO error: {e.message}")
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        
+        rows = [
+            KeywordRow.from_upstream(item)
+            for task in data.get("tasks") or ()
+            for item in task.get("result") or ()
+        ]
+        # Cache the unfiltered rows so any filter combination can reuse them
+        await shared_cache.set(cache_key, [row.to_dict() for row in rows], KEYWORD_CACHE_TTL)
+        await record_keyword_metrics(rows, request.location_name)
+    else:
+        rows = [KeywordRow.from_dict(item) for item in items]
+    
+    keywords = []
+    for row in rows:
+        sv = row.search_volume
+        cpc_val = row.cpc
+        
+        # Apply filters
+        if sv < request.min_volume or sv > request.max_volume:
+            continue
+        if cpc_val < request.min_cpc:
+            continue
+        if request.max_cpc and cpc_val > request.max_cpc:
+            continue
+        
+        keywords.append(row.to_dict())
+        if len(keywords) >= request.limit:
+            break
+    
+    return {"keywords": keywords, "source": source}
 
 def generate_mock_keywords(seed: str, min_vol: int, max_vol: int, min_cpc: float, limit: int) -> List[dict]:
     """Generate mock keyword data for demo purposes."""
-    import random
-    
     cities = ["phoenix", "new york", "los angeles", "chicago", "houston", "miami", "seattle", "denver", "atlanta", "dallas"]
     services = ["plumber", "roofing", "hvac", "electrician", "lawyer", "dentist", "contractor", "landscaping", "pool service", "tree service"]
     
@@ -375,91 +1164,93 @@ def generate_mock_keywords(seed: str, min_vol: int, max_vol: int, min_cpc: float
     
     return keywords
 
+def serp_cache_key(keyword: str, location_name: str, language_name: str) -> str:
+    return SharedCache.make_key("serp", keyword.strip().lower(), location_name, language_name)
+
+async def fetch_serp_rows(keyword: str, location_name: str, language_name: str, user_id: str) -> Tuple[List[SerpRow], str]:
+    """Top organic rows for a keyword from the shared cache, else DataForSEO (not enriched or cached yet)."""
+    cached = await shared_cache.get(serp_cache_key(keyword, location_name, language_name))
+    if cached is not None:
+        return [SerpRow.from_dict(result) for result in cached], "cache"
+    
+    data = await dataforseo.post(
+        "/serp/google/organic/live/advanced",
+        [{
+            "keyword": keyword,
+            "location_name": location_name,
+            "language_name": language_name,
+            "device": "desktop",
+            "os": "windows"
+        }],
+        user_id
+    )
+    return extract_organic_results(data), "dataforseo"
+
 @api_router.post("/serp/analyze")
-async def analyze_serp(request: SERPAnalysisRequest, current_user: dict = Depends(get_current_user)):
+async def analyze_serp(
+    request: SERPAnalysisRequest,
+    current_user: dict = Depends(fair_share())
+):
     """Analyze SERP results for a keyword using DataForSEO."""
+    await enforce_quota(current_user["id"], "serp")
     if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
         # Return mock data if no API credentials
-        mock_results = generate_mock_serp(request.keyword)
-        kill_score = calculate_kill_score(mock_results, {"keyword": request.keyword, "search_volume": 500, "cpc": 25})
-        return {"results": mock_results, "kill_score": kill_score, "source": "mock"}
+        mock_rows = generate_mock_serp(request.keyword)
+        kill_score = calculate_kill_score(mock_rows, {"keyword": request.keyword, "search_volume": 500, "cpc": 25})
+        return {"results": [row.to_dict() for row in mock_rows], "kill_score": kill_score, "source": "mock"}
     
     try:
-        auth_string = base64.b64encode(f"{DATAFORSEO_LOGIN}:{DATAFORSEO_PASSWORD}".encode()).decode()
-        
-        async with httpx.AsyncClient() as client_http:
-            response = await client_http.post(
-                "https://api.dataforseo.com/v3/serp/google/organic/live/advanced",
-                headers={
-                    "Authorization": f"Basic {auth_string}",
-                    "Content-Type": "application/json"
-                },
-                json=[{
-                    "keyword": request.keyword,
-                    "location_name": request.location_name,
-                    "language_name": request.language_name,
-                    "device": "desktop",
-                    "os": "windows"
-                }],
-                timeout=60.0
+        rows, source = await fetch_serp_rows(
+            request.keyword, request.location_name, request.language_name, current_user["id"]
+        )
+        if source == "dataforseo":
+            await enrich_domain_metrics(rows, current_user["id"])
+            await shared_cache.set(
+                serp_cache_key(request.keyword, request.location_name, request.language_name),
+                [row.to_dict() for row in rows],
+                SERP_CACHE_TTL
             )
-            
-            data = response.json()
-            
-            if data.get("status_code") != 20000:
-                mock_results = generate_mock_serp(request.keyword)
-                kill_score = calculate_kill_score(mock_results, {"keyword": request.keyword, "search_volume": 500, "cpc": 25})
-                return {"results": mock_results, "kill_score": kill_score, "source": "mock"}
-            
-            results = []
-            directory_domains = ['yelp.com', 'bbb.org', 'angieslist.com', 'angi.com', 'yellowpages.com']
-            
-            tasks = data.get("tasks", [])
-            for task in tasks:
-                task_result = task.get("result", [])
-                for result_item in task_result:
-                    items = result_item.get("items", [])
-                    for item in items:
-                        if item.get("type") != "organic":
-                            continue
-                        
-                        domain = extract_domain(item.get("url", ""))
-                        is_directory = any(d in domain.lower() for d in directory_domains)
-                        
-                        results.append({
-                            "rank": item.get("rank_absolute", 0),
-                            "domain": domain,
-                            "url": item.get("url", ""),
-                            "title": item.get("title", ""),
-                            "description": item.get("description", ""),
-                            "domain_rank": item.get("rank_info", {}).get("main_domain_rank", 0) if item.get("rank_info") else 0,
-                            "backlinks": item.get("backlinks_info", {}).get("backlinks", 0) if item.get("backlinks_info") else 0,
-                            "is_directory": is_directory,
-                            "is_replaceable": is_directory or (item.get("rank_info", {}).get("main_domain_rank", 100) or 100) < 40
-                        })
-            
-            results = results[:10]
-            kill_score = calculate_kill_score(results, {"keyword": request.keyword, "search_volume": 500, "cpc": 25})
-            return {"results": results, "kill_score": kill_score, "source": "dataforseo"}
-            
-    except Exception as e:
-        logger.error(f"SERP analysis error: {str(e)}")
-        mock_results = generate_mock_serp(request.keyword)
-        kill_score = calculate_kill_score(mock_results, {"keyword": request.keyword, "search_volume": 500, "cpc": 25})
-        return {"results": mock_results, "kill_score": kill_score, "source": "mock"}
+    except UpstreamError as e:
+        logger.error(f"SERP analysis error: {e.message}")
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    results = [row.to_dict() for row in rows]
+    
+    # Score against the keyword's tracked metrics when we have them
+    keyword_data = {"keyword": request.keyword, "search_volume": 500, "cpc": 25}
+    metrics = await get_recent_metrics([request.keyword], request.location_name)
+    if request.keyword.strip().lower() in metrics:
+        keyword_data.update(metrics[request.keyword.strip().lower()])
+    kill_score = calculate_kill_score(rows, keyword_data)
+    return {"results": results, "kill_score": kill_score, "source": source}
+
+SERP_DIRECTORY_DOMAINS = ('yelp.com', 'bbb.org', 'angieslist.com', 'angi.com', 'yellowpages.com')
+
+def extract_organic_results(data: dict, limit: int = 10) -> List[SerpRow]:
+    """Pull the organic rows we score from a decoded /organic/live/advanced body.
+    
+    Single pass with early exit: stops after `limit` organic items and only
+    touches the handful of fields the Kill Score needs.
+    """
+    results = []
+    for task in data.get("tasks") or ():
+        for result_item in task.get("result") or ():
+            for item in result_item.get("items") or ():
+                if item.get("type") != "organic":
+                    continue
+                results.append(SerpRow.from_upstream(item))
+                if len(results) >= limit:
+                    return results
+    return results
 
 def extract_domain(url: str) -> str:
-    from urllib.parse import urlparse
     try:
         parsed = urlparse(url)
         return parsed.netloc.replace("www.", "")
     except:
         return url
 
-def generate_mock_serp(keyword: str) -> List[dict]:
+def generate_mock_serp(keyword: str) -> List[SerpRow]:
     """Generate mock SERP data for demo purposes."""
-    import random
-    
     directory_sites = [
         {"domain": "yelp.com", "name": "Yelp"},
         {"domain": "bbb.org", "name": "BBB"},
@@ -479,36 +1270,805 @@ def generate_mock_serp(keyword: str) -> List[dict]:
         if random.random() < 0.4:
             # Directory site
             site = random.choice(directory_sites)
-            results.append({
-                "rank": i + 1,
-                "domain": site["domain"],
-                "url": f"https://www.{site['domain']}/search?q={keyword.replace(' ', '+')}",
-                "title": f"{site['name']} - Find {keyword.title()} Near You",
-                "description": f"Find the best {keyword} services. Read reviews, compare prices, and get quotes.",
-                "domain_rank": random.randint(70, 95),
-                "backlinks": random.randint(10000, 500000),
-                "is_directory": True,
-                "is_replaceable": True
-            })
+            results.append(SerpRow(
+                rank=i + 1,
+                domain=site["domain"],
+                url=f"https://www.{site['domain']}/search?q={keyword.replace(' ', '+')}",
+                title=f"{site['name']} - Find {keyword.title()} Near You",
+                description=f"Find the best {keyword} services. Read reviews, compare prices, and get quotes.",
+                domain_rank=random.randint(70, 95),
+                backlinks=random.randint(10000, 500000),
+                is_directory=True,
+                is_replaceable=True
+            ))
         else:
             # Local business
             domain = random.choice(local_businesses)
-            results.append({
-                "rank": i + 1,
-                "domain": domain,
-                "url": f"https://www.{domain}/",
-                "title": f"Best {keyword.title()} Services | {domain.split('.')[0].title()}",
-                "description": f"Professional {keyword} services. Licensed and insured. Call for free quote.",
-                "domain_rank": random.randint(10, 45),
-                "backlinks": random.randint(5, 200),
-                "is_directory": False,
-                "is_replaceable": random.random() < 0.6
-            })
+            results.append(SerpRow(
+                rank=i + 1,
+                domain=domain,
+                url=f"https://www.{domain}/",
+                title=f"Best {keyword.title()} Services | {domain.split('.')[0].title()}",
+                description=f"Professional {keyword} services. Licensed and insured. Call for free quote.",
+                domain_rank=random.randint(10, 45),
+                backlinks=random.randint(5, 200),
+                is_directory=False,
+                is_replaceable=random.random() < 0.6
+            ))
     
     return results
 
+@api_router.get("/usage")
+async def get_usage(days: int = 30, current_user: dict = Depends(get_current_user)):
+    """Get DataForSEO spend for the current user over the last N days."""
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days)).isoformat()
+    usage = await db.api_usage.find(
+        {"user_id": current_user["id"], "date": {"$gte": since}},
+        {"_id": 0, "user_id": 0}
+    ).sort("date", -1).to_list(days + 1)
+    
+    return {
+        "usage": usage,
+        "daily_budget": DATAFORSEO_USER_DAILY_BUDGET or None,
+        "upstream": {"circuit": dataforseo.breaker.state, "rate_per_sec": round(dataforseo.bucket.rate, 2)}
+    }
+
+# ============== COMPETITOR DOMAIN METRICS ==============
+
+DOMAIN_METRICS_CHUNK = 1000  # DataForSEO bulk endpoints accept up to 1000 targets
+
+async def fetch_domain_metrics(domains: List[str], user_id: str) -> dict:
+    """Rank and backlinks for many domains via the DataForSEO bulk endpoints, two calls per 1000 domains."""
+    metrics = {domain: {"domain_rank": None, "backlinks": None} for domain in domains}
+    for start in range(0, len(domains), DOMAIN_METRICS_CHUNK):
+        targets = domains[start:start + DOMAIN_METRICS_CHUNK]
+        ranks, backlinks = await asyncio.gather(
+            dataforseo.post("/backlinks/bulk_ranks/live", [{"targets": targets, "rank_scale": "one_hundred"}], user_id),
+            dataforseo.post("/backlinks/bulk_backlinks/live", [{"targets": targets}], user_id)
+        )
+        for task in ranks.get("tasks") or ():
+            for result in task.get("result") or ():
+                for item in result.get("items") or ():
+                    if item.get("target") in metrics:
+                        metrics[item["target"]]["domain_rank"] = item.get("rank")
+        for task in backlinks.get("tasks") or ():
+            for result in task.get("result") or ():
+                for item in result.get("items") or ():
+                    if item.get("target") in metrics:
+                        metrics[item["target"]]["backlinks"] = item.get("backlinks")
+    return metrics
+
+async def enrich_domain_metrics(rows: List[SerpRow], user_id: str) -> int:
+    """Fill missing domain_rank/backlinks on SERP rows in place, one lookup per unique domain.
+    
+    Known domains come from the domain_metrics collection in a single query;
+    the rest are fetched in bulk and stored for every later SERP that shows
+    them. Returns the number of domains fetched from DataForSEO.
+    """
+    missing = {row.domain for row in rows if row.domain and not (row.domain_rank and row.backlinks)}
+    if not missing:
+        return 0
+    
+    known = {}
+    async for doc in db.domain_metrics.find({"domain": {"$in": list(missing)}}, {"_id": 0, "fetched_at": 0}):
+        known[doc["domain"]] = doc
+    
+    to_fetch = sorted(missing - known.keys())
+    if to_fetch and DATAFORSEO_LOGIN and DATAFORSEO_PASSWORD:
+        try:
+            fetched = await fetch_domain_metrics(to_fetch, user_id)
+        except UpstreamError as e:
+            # Enrichment is best effort; score with whatever the SERP carried
+            logger.warning(f"Domain metrics enrichment skipped: {e.message}")
+            fetched = {}
+        if fetched:
+            now = datetime.now(timezone.utc)
+            await db.domain_metrics.bulk_write([
+                UpdateOne({"domain": domain}, {"$set": {**values, "fetched_at": now}}, upsert=True)
+                for domain, values in fetched.items()
+            ], ordered=False)
+            for domain, values in fetched.items():
+                known[domain] = {"domain": domain, **values}
+    else:
+        fetched = {}
+    
+    for row in rows:
+        values = known.get(row.domain)
+        if not values:
+            continue
+        if not row.domain_rank and values.get("domain_rank"):
+            row.domain_rank = values["domain_rank"]
+            row.is_replaceable = row.is_directory or row.domain_rank < 40
+        if not row.backlinks and values.get("backlinks"):
+            row.backlinks = values["backlinks"]
+    return len(fetched)
+
+# ============== KEYWORD CLUSTERING ==============
+
+# Filler words that don't change which pages rank. "in" and "me" are also state codes;
+# keyword_cluster_key only keeps them as one when they end the keyword after a city.
+CLUSTER_STOPWORDS = frozenset({"a", "an", "the", "in", "me", "near", "for", "of", "and", "to", "my", "best", "top"})
+# Multi-word filler removed before tokens are looked at on their own
+CLUSTER_FILLER_PHRASES = (("near", "me"),)
+US_STATE_CODES = frozenset({
+    "al", "ak", "az", "ar", "ca", "co", "ct", "de", "fl", "ga", "hi", "id", "il", "in", "ia", "ks", "ky",
+    "la", "me", "md", "ma", "mi", "mn", "ms", "mo", "mt", "ne", "nv", "nh", "nj", "nm", "ny", "nc", "nd",
+    "oh", "ok", "or", "pa", "ri", "sc", "sd", "tn", "tx", "ut", "vt", "va", "wa", "wv", "wi", "wy", "dc"
+})
+# Token-set duplicates share a representative's SERP with this confidence
+CLUSTER_TOKEN_CONFIDENCE = 0.9
+# Lower when the match needed a trailing state code dropped ("plumbers phoenix az" -> "phoenix plumber")
+CLUSTER_STATE_CONFIDENCE = 0.75
+# SERP sources trusted to confirm an alias between clusters
+CLUSTER_ALIAS_SOURCES = frozenset({"dataforseo", "cache"})
+
+def light_stem(token: str) -> str:
+    """Strip plural endings: plumbers -> plumber, companies -> company."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 4 and token.endswith(("ches", "shes", "sses", "xes")):
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+def keyword_cluster_key(keyword: str) -> Tuple[str, Optional[str]]:
+    """Order-insensitive normalized form plus the trailing state code it dropped, if any.
+    
+    "plumbers phoenix az" -> ("phoenix plumber", "az"), "plumber in phoenix"
+    -> ("phoenix plumber", None), "plumbers near me" -> ("plumber", None).
+    The key is "" for keywords without any letters or digits.
+    """
+    tokens = re.findall(r"[a-z0-9]+", keyword.lower())
+    for phrase in CLUSTER_FILLER_PHRASES:
+        size = len(phrase)
+        i = 0
+        while i <= len(tokens) - size:
+            if tuple(tokens[i:i + size]) == phrase:
+                del tokens[i:i + size]
+            else:
+                i += 1
+    state = None
+    # A trailing state code after a city may be redundant; on its own ("la plumber") it is the location
+    if len(tokens) > 2 and tokens[-1] in US_STATE_CODES:
+        state = tokens.pop()
+    stems = {light_stem(token) for token in tokens if token not in CLUSTER_STOPWORDS}
+    return " ".join(sorted(stems or tokens)), state
+
+def serp_domain_overlap(a: List[SerpRow], b: List[SerpRow]) -> float:
+    """Jaccard similarity of the top-10 organic domains of two SERPs."""
+    domains_a = {row.domain for row in a[:10] if row.domain}
+    domains_b = {row.domain for row in b[:10] if row.domain}
+    if not domains_a or not domains_b:
+        return 0.0
+    return len(domains_a & domains_b) / len(domains_a | domains_b)
+
+def cluster_alias_key(cluster_key: str, location: str, language: str) -> str:
+    return SharedCache.make_key("cluster_alias", cluster_key, location, language)
+
+async def cluster_keywords(keywords: List[str], location: str, language: str) -> dict:
+    """Group keywords into {cluster_key: [(keyword, confidence), ...]}.
+    
+    Keywords with the same token set share a cluster. A trailing state code
+    is only dropped when the batch has no other state for the same phrase,
+    so "plumber portland me" and "plumber portland or" stay apart. Clusters
+    whose representatives returned overlapping SERPs in an earlier batch are
+    merged through aliases kept in the shared cache. Keywords without any
+    letters or digits are not clustered.
+    """
+    parsed = {keyword: keyword_cluster_key(keyword) for keyword in keywords}
+    states = {}
+    for base, state in parsed.values():
+        if state:
+            states.setdefault(base, set()).add(state)
+    
+    keys = {}
+    for keyword, (base, state) in parsed.items():
+        if not base:
+            keys[keyword] = (f"keyword:{keyword}", 1.0)
+        elif state is None:
+            keys[keyword] = (base, CLUSTER_TOKEN_CONFIDENCE)
+        elif len(states[base]) == 1:
+            keys[keyword] = (base, CLUSTER_STATE_CONFIDENCE)
+        else:
+            keys[keyword] = (f"{base} @{state}", CLUSTER_TOKEN_CONFIDENCE)
+    
+    unique_keys = list(dict.fromkeys(key for key, _ in keys.values() if not key.startswith("keyword:")))
+    aliases = await shared_cache.get_many([cluster_alias_key(key, location, language) for key in unique_keys])
+    
+    clusters = {}
+    for keyword in keywords:
+        key, confidence = keys[keyword]
+        alias = aliases.get(cluster_alias_key(key, location, language))
+        if alias:
+            key, confidence = alias["key"], min(confidence, alias["similarity"])
+        clusters.setdefault(key, []).append((keyword, confidence))
+    return clusters
+
+def pick_representative(members: List[tuple], cached: set) -> str:
+    """Prefer a member whose SERP is already cached, then the shortest phrasing."""
+    return min((keyword for keyword, _ in members), key=lambda keyword: (keyword not in cached, len(keyword), keyword))
+
+def stem_variants(a: str, b: str) -> bool:
+    """Tokens that differ only by suffix: plumber/plumbing, roofer/roofing."""
+    prefix = len(os.path.commonprefix([a, b]))
+    return prefix >= 4 and prefix >= 0.6 * min(len(a), len(b))
+
+def near_duplicate_keys(a: str, b: str) -> bool:
+    """Whether two cluster keys could be the same search with different wording.
+    
+    True when the token sets match after pairing stem variants, or when one
+    key only adds a location suffix ("phoenix plumber" vs "phoenix plumber
+    @az"). Keys for different places or services ("phoenix plumber" vs
+    "mesa plumber") are never candidates, whatever their SERPs look like.
+    """
+    left, right = set(a.split()), set(b.split())
+    shared = left & right
+    left, right = left - shared, right - shared
+    for token in list(left):
+        match = next((other for other in right if stem_variants(token, other)), None)
+        if match:
+            left.discard(token)
+            right.discard(match)
+    extra = left | right
+    if not left or not right:
+        return not extra or (len(extra) == 1 and bool(shared) and extra.pop().lstrip("@") in US_STATE_CODES)
+    return False
+
+async def record_cluster_aliases(representatives: dict, fetched: dict, location: str, language: str, threshold: float) -> int:
+    """Alias near-duplicate clusters whose representative SERPs overlap so later batches analyze them once.
+    
+    Only real SERPs (fetched or cached) count; mock results share domains
+    by construction and would alias unrelated keywords.
+    """
+    keys = [
+        key for key, keyword in representatives.items()
+        if not key.startswith("keyword:") and fetched.get(keyword, (None, None))[1] in CLUSTER_ALIAS_SOURCES
+    ]
+    merged = set()
+    entries = []
+    for i, key in enumerate(keys):
+        if key in merged:
+            continue
+        rows = fetched[representatives[key]][0]
+        for other in keys[i + 1:]:
+            if other in merged or not near_duplicate_keys(key, other):
+                continue
+            similarity = serp_domain_overlap(rows, fetched[representatives[other]][0])
+            if similarity >= threshold:
+                merged.add(other)
+                entries.append((
+                    cluster_alias_key(other, location, language),
+                    {"key": key, "similarity": round(similarity, 2)},
+                    CLUSTER_ALIAS_TTL
+                ))
+    await shared_cache.set_many(entries)
+    return len(entries)
+
+BATCH_SERP_MAX_KEYWORDS = 100
+BATCH_SERP_CONCURRENCY = 5
+
+class BatchSERPAnalysisRequest(BaseModel):
+    keywords: List[str] = Field(..., min_length=1, max_length=BATCH_SERP_MAX_KEYWORDS)
+    location_name: str = "United States"
+    language_name: str = "English"
+    # Analyze one representative per near-duplicate cluster and share its result
+    cluster: bool = True
+    serp_overlap_threshold: float = Field(CLUSTER_SERP_OVERLAP, gt=0, le=1)
+    # Progress is pushed over /api/ws as job.* events carrying this id
+    job_id: Optional[str] = Field(None, max_length=64)
+
+@api_router.post("/serp/analyze/batch")
+async def analyze_serp_batch(request: BatchSERPAnalysisRequest, current_user: dict = Depends(get_current_user)):
+    """Analyze many SERPs; competitor metrics are enriched once per unique domain across the batch.
+    
+    With clustering on, near-duplicate keywords ("phoenix plumber",
+    "plumbers phoenix az") are analyzed once and the representative's SERP
+    and Kill Score are returned for every member with a cluster_confidence.
+    """
+    keywords = list(dict.fromkeys(k.strip() for k in request.keywords if k.strip()))
+    if request.cluster:
+        clusters = await cluster_keywords(keywords, request.location_name, request.language_name)
+        cached = await shared_cache.get_many([
+            serp_cache_key(keyword, request.location_name, request.language_name) for keyword in keywords
+        ])
+        cached_keywords = {
+            keyword for keyword in keywords
+            if serp_cache_key(keyword, request.location_name, request.language_name) in cached
+        }
+        representatives = {key: pick_representative(members, cached_keywords) for key, members in clusters.items()}
+    else:
+        clusters = {keyword: [(keyword, 1.0)] for keyword in keywords}
+        representatives = {keyword: keyword for keyword in keywords}
+    to_analyze = list(representatives.values())
+    await enforce_quota(current_user["id"], "serp", len(to_analyze))
+    job_id = request.job_id or str(uuid.uuid4())
+    await event_bus.publish(current_user["id"], "job.started", {"job_id": job_id, "kind": "serp_batch", "total": len(to_analyze)})
+    
+    if not DATAFORSEO_LOGIN or not DATAFORSEO_PASSWORD:
+        fetched = {keyword: (generate_mock_serp(keyword), "mock") for keyword in to_analyze}
+        errors = {}
+    else:
+        semaphore = asyncio.Semaphore(BATCH_SERP_CONCURRENCY)
+        done = 0
+        
+        async def fetch(keyword):
+            nonlocal done
+            try:
+                # Each SERP takes a batch slot, so interactive checks keep priority during a sweep
+                async with semaphore, scheduler.slot(current_user["id"], "batch"):
+                    return await fetch_serp_rows(keyword, request.location_name, request.language_name, current_user["id"])
+            finally:
+                done += 1
+                await event_bus.publish(
+                    current_user["id"], "job.progress",
+                    {"job_id": job_id, "done": done, "total": len(to_analyze), "keyword": keyword}
+                )
+        
+        outcomes = await asyncio.gather(*(fetch(keyword) for keyword in to_analyze), return_exceptions=True)
+        fetched, errors = {}, {}
+        for keyword, outcome in zip(to_analyze, outcomes):
+            if isinstance(outcome, (UpstreamError, SchedulerError)):
+                errors[keyword] = outcome.message
+            elif isinstance(outcome, Exception):
+                raise outcome
+            else:
+                fetched[keyword] = outcome
+    
+    # Only freshly fetched SERPs need enrichment; cached ones were enriched before they were stored
+    fresh = {keyword: rows for keyword, (rows, source) in fetched.items() if source == "dataforseo"}
+    domains_fetched = await enrich_domain_metrics([row for rows in fresh.values() for row in rows], current_user["id"])
+    await shared_cache.set_many([
+        (serp_cache_key(keyword, request.location_name, request.language_name), [row.to_dict() for row in rows], SERP_CACHE_TTL)
+        for keyword, rows in fresh.items()
+    ])
+    clusters_merged = 0
+    if request.cluster:
+        clusters_merged = await record_cluster_aliases(
+            representatives, fetched, request.location_name, request.language_name, request.serp_overlap_threshold
+        )
+    
+    metrics = await get_recent_metrics(list(fetched), request.location_name)
+    analyzed = {}
+    for keyword, (rows, source) in fetched.items():
+        keyword_data = {"keyword": keyword, "search_volume": 500, "cpc": 25, **metrics.get(keyword.lower(), {})}
+        analyzed[keyword] = {
+            "results": [row.to_dict() for row in rows],
+            "kill_score": calculate_kill_score(rows, keyword_data),
+            "source": source
+        }
+    
+    results = {}
+    for key, members in clusters.items():
+        representative = representatives[key]
+        for keyword, confidence in members:
+            if representative in errors:
+                result = {"keyword": keyword, "error": errors[representative], "source": "error"}
+            elif keyword == representative:
+                result = {"keyword": keyword, **analyzed[keyword], "cluster_confidence": 1.0}
+            else:
+                result = {"keyword": keyword, **analyzed[representative], "source": "cluster", "cluster_confidence": confidence}
+            if request.cluster:
+                result["representative"] = representative
+            results[keyword] = result
+    
+    await event_bus.publish(
+        current_user["id"], "job.completed",
+        {"job_id": job_id, "kind": "serp_batch", "total": len(to_analyze), "errors": len(errors)}
+    )
+    return {
+        "job_id": job_id,
+        "results": [results[keyword] for keyword in keywords],
+        "domains_fetched": domains_fetched,
+        "serp_checks": len(to_analyze),
+        "serp_checks_saved": len(keywords) - len(to_analyze),
+        "clusters_merged": clusters_merged
+    }
+
+# ============== KEYWORD HISTORY ==============
+
+class KeywordMetricsRequest(BaseModel):
+    keywords: List[str] = Field(..., max_length=1000)
+    location_name: str = "United States"
+    language_name: str = "English"
+    max_age_days: int = KEYWORD_METRICS_MAX_AGE_DAYS
+
+async def record_keyword_metrics(rows: List[KeywordRow], location: str):
+    """Append today's observation for each keyword to its keyword-month bucket."""
+    now = datetime.now(timezone.utc)
+    today = now.date().isoformat()
+    month = today[:7]
+    operations = []
+    for row in rows:
+        keyword = row.keyword.strip().lower()
+        if not keyword:
+            continue
+        observation = {
+            "date": today,
+            "search_volume": row.search_volume,
+            "cpc": row.cpc,
+            "competition": row.competition
+        }
+        # One observation per keyword per day: the filter skips buckets that already have today
+        operations.append(UpdateOne(
+            {"keyword": keyword, "location": location, "month": month, "observations.date": {"$ne": today}},
+            {"$push": {"observations": observation}, "$set": {"last": observation, "updated_at": now.isoformat()}},
+            upsert=True
+        ))
+    if not operations:
+        return
+    try:
+        await db.keyword_metrics.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate keys are the already-recorded-today case; anything else is a real failure
+        other = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+        if other:
+            logger.error(f"Keyword metrics write failed: {other[0].get('errmsg')}")
+
+async def get_recent_metrics(keywords: List[str], location: str, max_age_days: int = KEYWORD_METRICS_MAX_AGE_DAYS) -> dict:
+    """Latest observation per keyword if it is younger than max_age_days, keyed by normalized keyword."""
+    normalized = list({k.strip().lower() for k in keywords if k.strip()})
+    if not normalized:
+        return {}
+    since = (datetime.now(timezone.utc).date() - timedelta(days=max_age_days)).isoformat()
+    latest = {}
+    cursor = db.keyword_metrics.find(
+        {"keyword": {"$in": normalized}, "location": location, "last.date": {"$gte": since}},
+        {"_id": 0, "keyword": 1, "last": 1}
+    )
+    async for doc in cursor:
+        current = latest.get(doc["keyword"])
+        if current is None or doc["last"]["date"] > current["date"]:
+            latest[doc["keyword"]] = doc["last"]
+    return latest
+
+def metric_delta(current, previous):
+    # Google Ads competition can be a LOW/MEDIUM/HIGH label rather than a number
+    if isinstance(current, (int, float)) and isinstance(previous, (int, float)):
+        return round(current - previous, 4)
+    return current
+
+async def fetch_keyword_series(keyword: str, location: str, since_month: str) -> List[dict]:
+    docs = await db.keyword_metrics.find(
+        {"keyword": keyword, "location": location, "month": {"$gte": since_month}},
+        {"_id": 0, "observations": 1}
+    ).sort("month", 1).to_list(None)
+    return [observation for doc in docs for observation in doc["observations"]]
+
+@api_router.get("/keywords/history")
+async def get_keyword_history(
+    keyword: str,
+    location: str = "United States",
+    months: int = 12,
+    current_user: dict = Depends(get_current_user)
+):
+    """Time series of search volume, CPC and competition observations for a keyword."""
+    today = datetime.now(timezone.utc).date()
+    # Count back whole calendar months: from 2026-10, months=3 starts at 2026-08
+    start = today.year * 12 + today.month - 1 - max(months - 1, 0)
+    since_month = f"{start // 12:04d}-{start % 12 + 1:02d}"
+    series = await fetch_keyword_series(keyword.strip().lower(), location, since_month)
+    
+    trend = None
+    if len(series) >= 2:
+        first, last = series[0], series[-1]
+        trend = {
+            field: metric_delta(last[field], first[field])
+            for field in ("search_volume", "cpc", "competition")
+        }
+    
+    return {"keyword": keyword, "location": location, "series": series, "trend": trend}
+
+@api_router.get("/keywords/changes")
+async def get_keyword_changes(
+    since: str,
+    location: str = "United States",
+    limit: int = 500,
+    current_user: dict = Depends(get_current_user)
+):
+    """Keywords whose latest observation (on or after `since`) differs from the one before it."""
+    # One row per keyword: its newest bucket, even when `since` spans several months
+    docs = await db.keyword_metrics.aggregate([
+        {"$match": {"location": location, "last.date": {"$gte": since}}},
+        {"$sort": {"keyword": 1, "month": -1}},
+        {"$group": {
+            "_id": "$keyword",
+            "month": {"$first": "$month"},
+            "last_date": {"$first": "$last.date"},
+            "observations": {"$first": {"$slice": ["$observations", -2]}}
+        }},
+        {"$sort": {"last_date": -1}},
+        {"$limit": limit},
+        {"$project": {"_id": 0, "keyword": "$_id", "month": 1, "observations": 1}}
+    ]).to_list(limit)
+    
+    # Buckets holding a single observation compare against the tail of the keyword's previous bucket
+    need_previous = {doc["keyword"]: doc["month"] for doc in docs if len(doc["observations"]) < 2}
+    previous = {}
+    if need_previous:
+        cursor = db.keyword_metrics.find(
+            {"keyword": {"$in": list(need_previous)}, "location": location, "month": {"$lt": max(need_previous.values())}},
+            {"_id": 0, "keyword": 1, "month": 1, "last": 1}
+        )
+        months = {}
+        async for doc in cursor:
+            keyword = doc["keyword"]
+            if doc["month"] < need_previous[keyword] and doc["month"] > months.get(keyword, ""):
+                months[keyword] = doc["month"]
+                previous[keyword] = doc["last"]
+    
+    changes = []
+    for doc in docs:
+        observations = doc["observations"]
+        last = observations[-1]
+        before = observations[-2] if len(observations) > 1 else previous.get(doc["keyword"])
+        if before is None:
+            changes.append({"keyword": doc["keyword"], "status": "new", "current": last})
+            continue
+        delta = {
+            field: metric_delta(last[field], before[field])
+            for field in ("search_volume", "cpc", "competition")
+            if last[field] != before[field]
+        }
+        if delta:
+            changes.append({"keyword": doc["keyword"], "status": "changed", "current": last, "previous": before, "delta": delta})
+    
+    return {"since": since, "location": location, "changes": changes}
+
+@api_router.post("/keywords/metrics")
+async def get_keyword_metrics(request: KeywordMetricsRequest, current_user: dict = Depends(fair_share())):
+    """Current metrics for specific keywords: served from history when fresh, fetched for the rest."""
+    await enforce_quota(current_user["id"], "keywords")
+    stored = await get_recent_metrics(request.keywords, request.location_name, request.max_age_days)
+    metrics = [{"keyword": keyword, **observation, "source": "history"} for keyword, observation in stored.items()]
+    
+    missing = list({k.strip().lower() for k in request.keywords if k.strip()} - stored.keys())
+    if missing and DATAFORSEO_LOGIN and DATAFORSEO_PASSWORD:
+        try:
+            data = await dataforseo.post(
+                "/keywords_data/google_ads/search_volume/live",
+                [{
+                    "keywords": missing,
+                    "location_name": request.location_name,
+                    "language_name": request.language_name
+                }],
+                current_user["id"]
+            )
+        except UpstreamError as e:
+            logger.error(f"Keyword metrics error: {e.message}")
+            raise HTTPException(status_code=e.status_code, detail=e.message)
+        
+        rows = [
+            KeywordRow.from_upstream(item)
+            for task in data.get("tasks") or ()
+            for item in task.get("result") or ()
+        ]
+        await record_keyword_metrics(rows, request.location_name)
+        today = datetime.now(timezone.utc).date().isoformat()
+        metrics.extend(
+            {
+                "keyword": row.keyword.strip().lower(),
+                "date": today,
+                "search_volume": row.search_volume,
+                "cpc": row.cpc,
+                "competition": row.competition,
+                "source": "dataforseo"
+            }
+            for row in rows
+        )
+        fetched = {row.keyword.strip().lower() for row in rows}
+        missing = [keyword for keyword in missing if keyword not in fetched]
+    
+    return {"metrics": metrics, "missing": missing}
+
+# ============== DOMAIN AVAILABILITY ==============
+
+DEFAULT_DOMAIN_TLDS = ["com", "net", "co"]
+DOMAIN_CHECK_MAX = 1000
+# Inputs end up in DNS queries and RDAP URLs, so only plain hostnames are accepted
+TLD_PATTERN = re.compile(r"^(?:(?!-)[a-z0-9-]{1,63}(?<!-)\.)*(?!-)[a-z0-9-]{2,63}(?<!-)$")  # "com", "co.uk"
+DOMAIN_PATTERN = re.compile(r"^(?=.{1,253}$)(?:(?!-)[a-z0-9-]{1,63}(?<!-)\.)+(?!-)[a-z0-9-]{2,63}(?<!-)$")
+
+class DomainCandidatesRequest(BaseModel):
+    keywords: List[str]
+    tlds: List[str] = Field(default_factory=lambda: list(DEFAULT_DOMAIN_TLDS))
+    include_hyphenated: bool = True
+
+class DomainCheckRequest(DomainCandidatesRequest):
+    keywords: List[str] = Field(default_factory=list)
+    domains: List[str] = Field(default_factory=list)
+
+def normalize_tlds(tlds: List[str]) -> List[str]:
+    """Lowercase TLDs without dots; 400 if any is not a valid label."""
+    normalized = [tld.strip().strip(".").lower() for tld in tlds]
+    invalid = [tld for tld, value in zip(tlds, normalized) if not TLD_PATTERN.match(value)]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid TLD: {invalid[0]}")
+    return normalized
+
+def domain_candidates(keyword: str, tlds: List[str], include_hyphenated: bool = True) -> List[str]:
+    """Turn a keyword into exact-match domains, e.g. "plumber phoenix" -> plumberphoenix.com, plumber-phoenix.com."""
+    tokens = re.findall(r"[a-z0-9]+", keyword.lower())
+    if not tokens:
+        return []
+    labels = ["".join(tokens)]
+    if include_hyphenated and len(tokens) > 1:
+        labels.append("-".join(tokens))
+    return [
+        f"{label}.{tld}"
+        for tld in tlds
+        for label in labels
+        if len(label) <= 63
+    ]
+
+class DomainResolver(ABC):
+    """Backend that decides whether a single domain is registered."""
+
+    name = "base"
+
+    @abstractmethod
+    async def check(self, domain: str) -> str:
+        """Return "available", "registered" or "unknown"."""
+
+    async def close(self):
+        pass
+
+class StubResolver(DomainResolver):
+    """Offline resolver for tests and demos: only the configured domains are registered."""
+
+    name = "stub"
+
+    def __init__(self, registered: List[str]):
+        self.registered = set(registered)
+
+    async def check(self, domain: str) -> str:
+        return "registered" if domain in self.registered else "available"
+
+class DnsRdapResolver(DomainResolver):
+    """Cheap DNS NS lookup first; only names without delegation are confirmed over RDAP."""
+
+    name = "dns+rdap"
+
+    def __init__(self, rdap_url: str):
+        # dnspython is only needed by this resolver, so it is imported once here rather than at module load
+        import dns.asyncresolver
+        import dns.exception
+        import dns.resolver
+        self.rdap_url = rdap_url
+        self.resolver = dns.asyncresolver.Resolver()
+        self.resolver.lifetime = 3.0
+        self.lookup_errors = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers,
+                              dns.exception.Timeout)
+        self.http_client: Optional[httpx.AsyncClient] = None
+
+    async def check(self, domain: str) -> str:
+        try:
+            await self.resolver.resolve(domain, "NS")
+            # Delegated in the TLD zone, so it is registered
+            return "registered"
+        except self.lookup_errors:
+            # NXDOMAIN is a strong hint but registered domains can be undelegated: ask the registry
+            return await self.check_rdap(domain)
+
+    async def check_rdap(self, domain: str) -> str:
+        if self.http_client is None:
+            self.http_client = httpx.AsyncClient(timeout=10.0, follow_redirects=True)
+        try:
+            response = await self.http_client.get(f"{self.rdap_url}{domain}")
+        except httpx.HTTPError:
+            return "unknown"
+        if response.status_code == 404:
+            return "available"
+        if response.status_code == 200:
+            return "registered"
+        return "unknown"
+
+    async def close(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+class DomainChecker:
+    """Checks many domains concurrently with bounded parallelism and shared positive/negative caching."""
+
+    def __init__(self, resolver: DomainResolver, concurrency: int):
+        self.resolver = resolver
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def _check_one(self, domain: str) -> str:
+        async with self.semaphore:
+            try:
+                return await self.resolver.check(domain)
+            except Exception as e:
+                logger.warning(f"Domain check failed for {domain}: {str(e)}")
+                return "unknown"
+
+    async def check_many(self, domains: List[str]) -> dict:
+        """Return {domain: {"status", "cached"}} for every domain."""
+        keys = {domain: SharedCache.make_key("domain", self.resolver.name, domain) for domain in domains}
+        cached = await shared_cache.get_many(list(keys.values()))
+        results = {domain: {"status": cached[key], "cached": True} for domain, key in keys.items() if key in cached}
+        
+        pending = [domain for domain in domains if domain not in results]
+        statuses = await asyncio.gather(*(self._check_one(domain) for domain in pending))
+        
+        entries = []
+        for domain, domain_status in zip(pending, statuses):
+            results[domain] = {"status": domain_status, "cached": False}
+            # Registrations rarely lapse; availability can change any minute. Unknowns are retried next time.
+            if domain_status == "registered":
+                entries.append((keys[domain], domain_status, DOMAIN_REGISTERED_TTL))
+            elif domain_status == "available":
+                entries.append((keys[domain], domain_status, DOMAIN_AVAILABLE_TTL))
+        await shared_cache.set_many(entries)
+        return results
+
+def build_domain_resolver() -> DomainResolver:
+    if DOMAIN_RESOLVER == "stub":
+        return StubResolver(DOMAIN_STUB_REGISTERED)
+    return DnsRdapResolver(DOMAIN_RDAP_URL)
+
+domain_checker: Optional[DomainChecker] = None
+
+def get_domain_checker() -> DomainChecker:
+    global domain_checker
+    if domain_checker is None:
+        domain_checker = DomainChecker(build_domain_resolver(), DOMAIN_CHECK_CONCURRENCY)
+    return domain_checker
+
+@api_router.post("/domains/candidates")
+async def get_domain_candidates(request: DomainCandidatesRequest, current_user: dict = Depends(get_current_user)):
+    """List exact-match domain candidates for each keyword without checking them."""
+    tlds = normalize_tlds(request.tlds)
+    return {
+        "candidates": {
+            keyword: domain_candidates(keyword, tlds, request.include_hyphenated)
+            for keyword in request.keywords
+        }
+    }
+
+@api_router.post("/domains/check")
+async def check_domains(request: DomainCheckRequest, current_user: dict = Depends(get_current_user)):
+    """Check availability of explicit domains and/or the candidates generated from keywords."""
+    tlds = normalize_tlds(request.tlds)
+    sources = {}
+    for keyword in request.keywords:
+        for domain in domain_candidates(keyword, tlds, request.include_hyphenated):
+            sources.setdefault(domain, keyword)
+    for domain in request.domains:
+        domain = domain.strip().rstrip(".").lower()
+        if not DOMAIN_PATTERN.match(domain):
+            raise HTTPException(status_code=400, detail=f"Invalid domain: {domain}")
+        sources.setdefault(domain, None)
+    
+    if not sources:
+        raise HTTPException(status_code=400, detail="Provide keywords or domains to check")
+    if len(sources) > DOMAIN_CHECK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {DOMAIN_CHECK_MAX} domains per request")
+    
+    checker = get_domain_checker()
+    results = await checker.check_many(list(sources))
+    
+    return {
+        "results": [
+            {"domain": domain, "keyword": keyword, **results[domain]}
+            for domain, keyword in sources.items()
+        ],
+        "available": sum(1 for r in results.values() if r["status"] == "available"),
+        "resolver": checker.resolver.name
+    }
+
 # ============== AI ANALYSIS ENDPOINT ==============
 
+_llm_classes = None
+
+def load_llm():
+    """Import the LLM client on first use; emergentintegrations pulls in litellm, which takes seconds to import."""
+    global _llm_classes
+    if _llm_classes is None:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+        _llm_classes = (LlmChat, UserMessage)
+    return _llm_classes
+
 class AIAnalysisRequest(BaseModel):
     keyword: str
     serp_data: List[dict]
@@ -517,9 +2077,10 @@ class AIAnalysisRequest(BaseModel):
 @api_router.post("/ai/analyze")
 async def ai_analyze_opportunity(
     request: AIAnalysisRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(fair_share())
 ):
     """Use Claude AI to analyze EMD opportunity."""
+    await enforce_quota(current_user["id"], "ai")
     keyword = request.keyword
     serp_data = request.serp_data
     keyword_data = request.keyword_data
@@ -528,6 +2089,7 @@ async def ai_analyze_opportunity(
         return {"analysis": "AI analysis not available. Please configure EMERGENT_LLM_KEY.", "source": "mock"}
     
     try:
+        LlmChat, UserMessage = load_llm()
         chat = LlmChat(
             api_key=EMERGENT_LLM_KEY,
             session_id=f"emd-analysis-{uuid.uuid4()}",
@@ -561,8 +2123,14 @@ Top 10 SERP Results:
         
         prompt += "\nProvide your analysis of this EMD opportunity."
         
+        cache_key = SharedCache.make_key("ai", prompt)
+        cached = await shared_cache.get(cache_key)
+        if cached is not None:
+            return {"analysis": cached, "source": "cache"}
+        
         user_message = UserMessage(text=prompt)
         response = await chat.send_message(user_message)
+        await shared_cache.set(cache_key, response, AI_CACHE_TTL)
         
         return {"analysis": response, "source": "claude"}
         
@@ -570,35 +2138,503 @@ Top 10 SERP Results:
         logger.error(f"AI analysis error: {str(e)}")
         return {"analysis": f"AI analysis error: {str(e)}", "source": "error"}
 
+# ============== DASHBOARD STATS ==============
+
+STATS_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "kill_score": 1, "cpc": 1, "search_volume": 1, "location": 1}
+TOP_LOCATIONS = 5
+
+def kill_score_bucket(score: int) -> int:
+    # Ten buckets: 0-9, 10-19, ... 90-100
+    return min(max(int(score or 0), 0) // 10 * 10, 90)
+
+def encode_stats_key(value: str) -> str:
+    # Mongo field names cannot contain "." or start with "$"
+    return value.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+def decode_stats_key(value: str) -> str:
+    return value.replace("%24", "$").replace("%2E", ".").replace("%25", "%")
+
+def stats_increments(docs: List[dict], sign: int) -> dict:
+    """$inc document that adds (sign=1) or removes (sign=-1) opportunities from a stats document."""
+    inc = {}
+    def add(field, amount):
+        inc[field] = inc.get(field, 0) + amount
+    for doc in docs:
+        add("count", sign)
+        add(f"kill_score_buckets.{kill_score_bucket(doc.get('kill_score'))}", sign)
+        add("kill_score_sum", sign * (doc.get("kill_score") or 0))
+        add("cpc_sum", sign * (doc.get("cpc") or 0))
+        add("search_volume_sum", sign * (doc.get("search_volume") or 0))
+        add(f"locations.{encode_stats_key(doc.get('location') or 'Unknown')}", sign)
+    return inc
+
+async def apply_stats(user_id: str, inc: dict, max_kill_score: Optional[int] = None):
+    """Apply counter changes in a single upsert; also bumps the user's data version."""
+    update = {
+        "$inc": {**inc, "version": 1},
+        "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+    }
+    if max_kill_score is not None:
+        update["$max"] = {"max_kill_score": max_kill_score}
+    await db.stats.update_one({"user_id": user_id}, update, upsert=True)
+
+async def record_opportunities_added(docs: List[dict]):
+    by_user = {}
+    for doc in docs:
+        by_user.setdefault(doc["user_id"], []).append(doc)
+    for user_id, user_docs in by_user.items():
+        await apply_stats(user_id, stats_increments(user_docs, 1), max(doc.get("kill_score") or 0 for doc in user_docs))
+        await publish_opportunities_created(user_id, user_docs)
+
+async def refresh_max_kill_score(user_id: str, removed_scores: List[int]):
+    """Recompute max_kill_score when a removed or lowered score may have been the maximum."""
+    stats = await db.stats.find_one({"user_id": user_id}, {"_id": 0, "max_kill_score": 1})
+    if not stats or max(removed_scores, default=0) < (stats.get("max_kill_score") or 0):
+        return
+    top = await db.opportunities.find(
+        {"user_id": user_id}, {"_id": 0, "kill_score": 1}
+    ).sort("kill_score", -1).limit(1).to_list(1)
+    # Only replace the value we read; a concurrent save may already have raised it
+    await db.stats.update_one(
+        {"user_id": user_id, "max_kill_score": stats.get("max_kill_score")},
+        {"$set": {"max_kill_score": (top[0].get("kill_score") or 0) if top else 0}}
+    )
+
+async def invalidate_stats(user_id: str):
+    """Mark a user's stats for a full rebuild on the next read."""
+    await db.stats.update_one({"user_id": user_id}, {"$set": {"initialized": False}, "$inc": {"version": 1}})
+
+async def record_opportunities_removed(user_id: str, docs: List[dict]):
+    if docs:
+        await apply_stats(user_id, stats_increments(docs, -1))
+        await refresh_max_kill_score(user_id, [doc.get("kill_score") or 0 for doc in docs])
+        await event_bus.publish(user_id, "opportunities.deleted", {"ids": [doc["id"] for doc in docs]})
+
+async def delete_opportunity_docs(query: dict) -> List[dict]:
+    """Delete matching opportunities and take them out of the stats; returns the deleted docs' stat fields."""
+    docs = await db.opportunities.find(query, STATS_FIELDS).to_list(None)
+    if not docs:
+        return []
+    user_id = query["user_id"]
+    result = await db.opportunities.delete_many({"user_id": user_id, "id": {"$in": [doc["id"] for doc in docs]}})
+    if result.deleted_count == len(docs):
+        await record_opportunities_removed(user_id, docs)
+    else:
+        # A concurrent request deleted some of these first and counted them itself. We can't
+        # tell which, so rebuild the stats on the next read instead of guessing.
+        await invalidate_stats(user_id)
+        await event_bus.publish(user_id, "opportunities.deleted", {"ids": [doc["id"] for doc in docs]})
+    return docs
+
+async def rebuild_stats(user_id: str) -> dict:
+    """Recompute a user's stats from scratch (first read for portfolios saved before stats existed)."""
+    docs = await db.opportunities.find({"user_id": user_id}, STATS_FIELDS).to_list(None)
+    counters = {}
+    for field, amount in stats_increments(docs, 1).items():
+        target = counters
+        *parents, leaf = field.split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = amount
+    stats = {
+        "user_id": user_id,
+        "count": 0,
+        "kill_score_sum": 0,
+        "cpc_sum": 0,
+        "search_volume_sum": 0,
+        "kill_score_buckets": {},
+        "locations": {},
+        **counters,
+        "max_kill_score": max((doc.get("kill_score") or 0 for doc in docs), default=0),
+        "initialized": True,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+    previous = await db.stats.find_one_and_update(
+        {"user_id": user_id},
+        {"$set": stats, "$inc": {"version": 1}},
+        upsert=True,
+        projection={"_id": 0, "version": 1}
+    )
+    stats["version"] = ((previous or {}).get("version") or 0) + 1
+    return stats
+
+@api_router.get("/stats")
+async def get_stats(current_user: dict = Depends(get_current_user)):
+    """Portfolio summary for the dashboard, read from the incrementally maintained stats document."""
+    stats = await db.stats.find_one({"user_id": current_user["id"]}, {"_id": 0})
+    if not stats or not stats.get("initialized"):
+        stats = await rebuild_stats(current_user["id"])
+    
+    count = stats.get("count", 0)
+    buckets = stats.get("kill_score_buckets", {})
+    locations = sorted(
+        ((decode_stats_key(key), value) for key, value in stats.get("locations", {}).items() if value > 0),
+        key=lambda item: item[1],
+        reverse=True
+    )
+    return {
+        "total_opportunities": count,
+        "avg_kill_score": round(stats.get("kill_score_sum", 0) / count, 1) if count else 0,
+        "max_kill_score": stats.get("max_kill_score", 0) if count else 0,
+        "avg_cpc": round(stats.get("cpc_sum", 0) / count, 2) if count else 0,
+        "avg_search_volume": round(stats.get("search_volume_sum", 0) / count) if count else 0,
+        "kill_score_histogram": [
+            {"bucket": f"{low}-{low + 9 if low < 90 else 100}", "count": buckets.get(str(low), 0)}
+            for low in range(0, 100, 10)
+        ],
+        "top_locations": [{"location": name, "count": value} for name, value in locations[:TOP_LOCATIONS]],
+        "updated_at": stats.get("updated_at")
+    }
+
+# ============== OPPORTUNITY IMPORT / EXPORT ==============
+
+EXPORT_FIELDS = ["id", "keyword", "location", "search_volume", "cpc", "competition",
+                 "kill_score", "serp_results", "ai_analysis", "created_at"]
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_BATCH_SIZE = 1000
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_MAX_ERRORS = 100
+# Exported serp_results cells can exceed the csv module's 128 KiB default
+IMPORT_CSV_FIELD_LIMIT = 64 * 1024 * 1024
+
+class ImportResult(BaseModel):
+    received: int
+    inserted: int
+    failed: int
+    errors: List[dict]
+
+async def insert_opportunity_docs(docs: List[dict]) -> List[Optional[str]]:
+    """Insert documents with one unordered insert_many; returns an error message (or None) per doc."""
+    errors: List[Optional[str]] = [None] * len(docs)
+    if not docs:
+        return errors
+    try:
+        await db.opportunities.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            errors[write_error["index"]] = write_error.get("errmsg", "write failed")
+    for doc in docs:
+        doc.pop("_id", None)
+    await record_opportunities_added([doc for doc, error in zip(docs, errors) if not error])
+    return errors
+
+def build_opportunity_doc(opportunity: OpportunityCreate, user_id: str, created_at: Optional[str] = None) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        **opportunity.model_dump(),
+        "created_at": created_at or datetime.now(timezone.utc).isoformat()
+    }
+
+async def stream_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    rows = 0
+    async for doc in cursor:
+        doc["serp_results"] = orjson.dumps(doc.get("serp_results") or []).decode()
+        writer.writerow(doc)
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode()
+
+async def stream_ndjson(cursor):
+    chunk = []
+    async for doc in cursor:
+        chunk.append(orjson.dumps(doc))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file that hands its bytes back to a generator while keeping offsets intact."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+async def stream_parquet(cursor):
+    # Heavy optional import, only paid when a Parquet export is requested
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schema = pa.schema([
+        ("id", pa.string()), ("keyword", pa.string()), ("location", pa.string()),
+        ("search_volume", pa.int64()), ("cpc", pa.float64()), ("competition", pa.float64()),
+        ("kill_score", pa.int64()), ("serp_results", pa.string()), ("ai_analysis", pa.string()),
+        ("created_at", pa.string()),
+    ])
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    
+    def flush(rows):
+        # One row group per batch keeps memory bounded to EXPORT_BATCH_SIZE rows
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        return sink.drain()
+    
+    rows = []
+    async for doc in cursor:
+        doc["serp_results"] = orjson.dumps(doc.get("serp_results") or []).decode()
+        rows.append({field: doc.get(field) for field in EXPORT_FIELDS})
+        if len(rows) >= EXPORT_BATCH_SIZE:
+            yield flush(rows)
+            rows = []
+    if rows:
+        yield flush(rows)
+    writer.close()
+    yield sink.drain()
+
+@api_router.get("/opportunities/export")
+async def export_opportunities(format: str = "csv", current_user: dict = Depends(get_current_user)):
+    """Stream all saved opportunities as CSV, NDJSON or Parquet."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}")
+    
+    cursor = db.opportunities.find(
+        {"user_id": current_user["id"]},
+        {"_id": 0, "user_id": 0}
+    ).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+    
+    streamers = {"csv": stream_csv, "ndjson": stream_ndjson, "parquet": stream_parquet}
+    filename = f"opportunities-{datetime.now(timezone.utc).date().isoformat()}.{format}"
+    return StreamingResponse(
+        streamers[format](cursor),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def iter_import_rows(upload: UploadFile, format: str):
+    """Yield undecoded rows (CSV dicts, NDJSON lines, Parquet dicts) without loading the file into memory.
+    
+    Errors raised here mean the file itself is unreadable; per-row problems
+    surface in decode_import_row.
+    """
+    if format == "csv":
+        # The limit is process-wide in the csv module; raising it only affects readers like this one
+        csv.field_size_limit(max(csv.field_size_limit(), IMPORT_CSV_FIELD_LIMIT))
+        yield from csv.DictReader(io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline=""))
+    elif format == "ndjson":
+        for line in upload.file:
+            if line.strip():
+                yield line
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(upload.file).iter_batches(batch_size=IMPORT_CHUNK_SIZE):
+            yield from batch.to_pylist()
+
+def decode_import_row(raw, format: str) -> dict:
+    """Turn one raw row into a dict for OpportunityCreate; raises ValueError on a malformed line or cell."""
+    if format == "ndjson":
+        row = orjson.loads(raw)
+        if not isinstance(row, dict):
+            raise ValueError("line is not a JSON object")
+        return row
+    row = raw
+    if format == "csv":
+        row["serp_results"] = orjson.loads(row["serp_results"]) if row.get("serp_results") else []
+        if not row.get("ai_analysis"):
+            row["ai_analysis"] = None
+    elif isinstance(row.get("serp_results"), str):
+        row["serp_results"] = orjson.loads(row["serp_results"])
+    return row
+
+@api_router.post("/opportunities/import", response_model=ImportResult)
+async def import_opportunities(
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Bulk import opportunities from a CSV, NDJSON or Parquet file (as produced by /opportunities/export)."""
+    format = format or (file.filename or "").rsplit(".", 1)[-1].lower()
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}")
+    
+    received = inserted = failed = 0
+    errors = []
+    chunk, chunk_rows = [], []
+    
+    def record_error(row_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": row_number, "error": message})
+    
+    async def flush():
+        nonlocal inserted
+        results = await insert_opportunity_docs(chunk)
+        for row_number, error in zip(chunk_rows, results):
+            if error:
+                record_error(row_number, error)
+            else:
+                inserted += 1
+        chunk.clear()
+        chunk_rows.clear()
+    
+    rows = iter_import_rows(file, format)
+    while True:
+        row_number = received + 1
+        try:
+            raw = next(rows)
+        except StopIteration:
+            break
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            # The file itself is unreadable (broken encoding, bad CSV quoting, not Parquet): stop reading
+            received += 1
+            record_error(row_number, f"Unreadable input: {str(e)}")
+            break
+        received += 1
+        try:
+            row = decode_import_row(raw, format)
+        except ValueError as e:
+            record_error(row_number, f"Malformed row: {str(e)}")
+            continue
+        try:
+            opportunity = OpportunityCreate.model_validate(row)
+        except ValidationError as e:
+            record_error(row_number, "; ".join(
+                f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+            continue
+        created_at = row.get("created_at") if isinstance(row.get("created_at"), str) and row.get("created_at") else None
+        chunk.append(build_opportunity_doc(opportunity, current_user["id"], created_at))
+        chunk_rows.append(row_number)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await flush()
+    await flush()
+    
+    return ImportResult(received=received, inserted=inserted, failed=failed, errors=errors)
+
 # ============== OPPORTUNITIES ENDPOINTS ==============
 
 @api_router.post("/opportunities", response_model=OpportunityResponse)
 async def save_opportunity(opportunity: OpportunityCreate, current_user: dict = Depends(get_current_user)):
     """Save an EMD opportunity."""
-    opp_id = str(uuid.uuid4())
-    opp_doc = {
-        "id": opp_id,
-        "user_id": current_user["id"],
-        **opportunity.model_dump(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    opp_doc = build_opportunity_doc(opportunity, current_user["id"])
     
     await db.opportunities.insert_one(opp_doc)
+    await record_opportunities_added([opp_doc])
     
     return OpportunityResponse(**opp_doc)
 
+BULK_MAX_ITEMS = 1000
+
+class BulkOpportunityCreate(BaseModel):
+    opportunities: List[OpportunityCreate] = Field(..., max_length=BULK_MAX_ITEMS)
+
+class OpportunityFilter(BaseModel):
+    keyword_contains: Optional[str] = None
+    location: Optional[str] = None
+    min_kill_score: Optional[int] = None
+    max_kill_score: Optional[int] = None
+    created_before: Optional[str] = None
+
+class BulkOpportunityDelete(BaseModel):
+    ids: Optional[List[str]] = Field(None, max_length=BULK_MAX_ITEMS)
+    filter: Optional[OpportunityFilter] = None
+
+def build_opportunity_query(user_id: str, filters: OpportunityFilter) -> dict:
+    query = {"user_id": user_id}
+    if filters.keyword_contains:
+        query["keyword"] = {"$regex": re.escape(filters.keyword_contains), "$options": "i"}
+    if filters.location:
+        query["location"] = filters.location
+    if filters.min_kill_score is not None or filters.max_kill_score is not None:
+        query["kill_score"] = {}
+        if filters.min_kill_score is not None:
+            query["kill_score"]["$gte"] = filters.min_kill_score
+        if filters.max_kill_score is not None:
+            query["kill_score"]["$lte"] = filters.max_kill_score
+    if filters.created_before:
+        query["created_at"] = {"$lt": filters.created_before}
+    return query
+
+@api_router.post("/opportunities/bulk")
+async def bulk_save_opportunities(request: BulkOpportunityCreate, current_user: dict = Depends(get_current_user)):
+    """Save many opportunities in one unordered insert_many."""
+    docs = [build_opportunity_doc(opportunity, current_user["id"]) for opportunity in request.opportunities]
+    errors = await insert_opportunity_docs(docs)
+    
+    results = []
+    for index, (doc, error) in enumerate(zip(docs, errors)):
+        if error:
+            results.append({"index": index, "status": "error", "error": error})
+        else:
+            results.append({"index": index, "status": "created", "opportunity": OpportunityResponse(**doc)})
+    created = sum(1 for error in errors if not error)
+    
+    return {"created": created, "failed": len(docs) - created, "results": results}
+
+@api_router.post("/opportunities/bulk/delete")
+async def bulk_delete_opportunities(request: BulkOpportunityDelete, current_user: dict = Depends(get_current_user)):
+    """Delete opportunities by id list or by filter with a single delete_many."""
+    if (request.ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either ids or filter")
+    
+    if request.ids is not None:
+        deleted = await delete_opportunity_docs({"user_id": current_user["id"], "id": {"$in": request.ids}})
+        existing = {doc["id"] for doc in deleted}
+        return {
+            "deleted": len(deleted),
+            "results": [
+                {"id": opp_id, "status": "deleted" if opp_id in existing else "not_found"}
+                for opp_id in request.ids
+            ]
+        }
+    
+    query = build_opportunity_query(current_user["id"], request.filter)
+    if len(query) == 1:
+        raise HTTPException(status_code=400, detail="Filter must set at least one condition")
+    deleted = await delete_opportunity_docs(query)
+    return {"deleted": len(deleted)}
+
 @api_router.get("/opportunities", response_model=List[OpportunityResponse])
-async def get_opportunities(current_user: dict = Depends(get_current_user)):
+async def get_opportunities(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     """Get all saved opportunities for the current user."""
+    # The version only moves on writes, so a repeat load is answered without reading the list
+    etag = f'W/"{current_user["id"]}-{await get_data_version(current_user["id"])}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     opportunities = await db.opportunities.find(
         {"user_id": current_user["id"]},
         {"_id": 0}
     ).sort("created_at", -1).to_list(100)
     
+    set_etag(response, etag)
     return [OpportunityResponse(**opp) for opp in opportunities]
 
 @api_router.get("/opportunities/{opportunity_id}", response_model=OpportunityResponse)
-async def get_opportunity(opportunity_id: str, current_user: dict = Depends(get_current_user)):
+async def get_opportunity(
+    opportunity_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user)
+):
     """Get a specific opportunity."""
     opportunity = await db.opportunities.find_one(
         {"id": opportunity_id, "user_id": current_user["id"]},
@@ -608,20 +2644,217 @@ async def get_opportunity(opportunity_id: str, current_user: dict = Depends(get_
     if not opportunity:
         raise HTTPException(status_code=404, detail="Opportunity not found")
     
+    etag = content_etag(opportunity)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return OpportunityResponse(**opportunity)
 
 @api_router.delete("/opportunities/{opportunity_id}")
 async def delete_opportunity(opportunity_id: str, current_user: dict = Depends(get_current_user)):
     """Delete an opportunity."""
-    result = await db.opportunities.delete_one(
-        {"id": opportunity_id, "user_id": current_user["id"]}
+    deleted = await db.opportunities.find_one_and_delete(
+        {"id": opportunity_id, "user_id": current_user["id"]},
+        projection=STATS_FIELDS
     )
     
-    if result.deleted_count == 0:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Opportunity not found")
     
+    await record_opportunities_removed(current_user["id"], [deleted])
     return {"message": "Opportunity deleted"}
 
+@api_router.post("/opportunities/{opportunity_id}/rescore", response_model=OpportunityResponse)
+async def rescore_opportunity(opportunity_id: str, current_user: dict = Depends(get_current_user)):
+    """Recalculate an opportunity's Kill Score from its saved SERP and latest keyword metrics."""
+    opportunity = await db.opportunities.find_one(
+        {"id": opportunity_id, "user_id": current_user["id"]},
+        {"_id": 0}
+    )
+    if not opportunity:
+        raise HTTPException(status_code=404, detail="Opportunity not found")
+    
+    keyword_data = {key: opportunity[key] for key in ("keyword", "search_volume", "cpc")}
+    metrics = await get_recent_metrics([opportunity["keyword"]], opportunity["location"])
+    latest = metrics.get(opportunity["keyword"].strip().lower())
+    if latest:
+        keyword_data.update(search_volume=latest["search_volume"], cpc=latest["cpc"])
+    
+    old_score = opportunity["kill_score"]
+    new_score = calculate_kill_score([SerpRow.from_dict(result) for result in opportunity["serp_results"]], keyword_data)
+    updated = {"kill_score": new_score, "search_volume": keyword_data["search_volume"], "cpc": keyword_data["cpc"]}
+    # Only apply if nothing changed since the read; a concurrent rescore or delete already did its own stats
+    matched = await db.opportunities.find_one_and_update(
+        {
+            "id": opportunity_id,
+            "user_id": current_user["id"],
+            "kill_score": old_score,
+            "search_volume": opportunity["search_volume"],
+            "cpc": opportunity["cpc"]
+        },
+        {"$set": updated},
+        projection={"_id": 0, "id": 1}
+    )
+    if not matched:
+        current = await db.opportunities.find_one({"id": opportunity_id, "user_id": current_user["id"]}, {"_id": 0})
+        if not current:
+            raise HTTPException(status_code=404, detail="Opportunity not found")
+        return OpportunityResponse(**current)
+    
+    # Move the opportunity between histogram buckets and adjust the running sums
+    inc = {}
+    for sign, doc in ((-1, opportunity), (1, {**opportunity, **updated})):
+        for field, amount in stats_increments([doc], sign).items():
+            inc[field] = inc.get(field, 0) + amount
+    await apply_stats(current_user["id"], {k: v for k, v in inc.items() if v}, new_score)
+    if new_score < old_score:
+        await refresh_max_kill_score(current_user["id"], [old_score])
+    
+    await event_bus.publish(current_user["id"], "opportunity.rescored", {"id": opportunity_id, "previous_kill_score": old_score, **updated})
+    
+    logger.info(f"Rescored opportunity {opportunity_id}: {old_score} -> {new_score}")
+    return OpportunityResponse(**{**opportunity, **updated})
+
+# ============== LIVE UPDATES ==============
+
+class EventBus:
+    """Per-user push of opportunity changes and job progress to WebSocket clients.
+    
+    On a replica set (or mongos) events are inserted into the `events`
+    collection and every worker tails it with a change stream, so a save in
+    one worker reaches tabs connected to any other. On a standalone server
+    change streams are unavailable and events are delivered in-process,
+    which only reaches clients of the same worker.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.mode = "local"
+        self.watch_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if EVENTS_MODE == "auto":
+            try:
+                hello = await client.admin.command("hello")
+            except Exception as e:
+                logger.warning(f"Could not detect Mongo topology, using in-process events: {str(e)}")
+                hello = {}
+            use_change_streams = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        else:
+            use_change_streams = EVENTS_MODE == "change_stream"
+        if use_change_streams:
+            self.mode = "change_stream"
+            self.watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self.watch_task is not None:
+            self.watch_task.cancel()
+            self.watch_task = None
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+    def deliver(self, user_id: str, event: dict):
+        for queue in self.subscribers.get(user_id, ()):
+            if queue.full():
+                # A stalled client loses its oldest events rather than holding memory
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def publish(self, user_id: str, event_type: str, data: dict):
+        """Best effort: a failed publish is logged and never fails the write that caused it."""
+        event = {"type": event_type, "data": data, "at": datetime.now(timezone.utc).isoformat()}
+        if self.mode == "local":
+            self.deliver(user_id, event)
+            return
+        try:
+            await db.events.insert_one({**event, "user_id": user_id, "created_at": datetime.now(timezone.utc)})
+        except Exception as e:
+            logger.warning(f"Event publish failed, delivering locally: {str(e)}")
+            self.deliver(user_id, event)
+
+    async def _watch(self):
+        resume_token = None
+        while True:
+            try:
+                async with db.events.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change["fullDocument"]
+                        if doc["user_id"] in self.subscribers:
+                            self.deliver(doc["user_id"], {key: doc[key] for key in ("type", "data", "at")})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event change stream interrupted, reconnecting: {str(e)}")
+                if isinstance(e, OperationFailure):
+                    # The resume point may have left the oplog; start from now instead of failing forever
+                    resume_token = None
+                await asyncio.sleep(1)
+
+event_bus = EventBus()
+
+async def publish_opportunities_created(user_id: str, docs: List[dict]):
+    # Large imports only announce the count; clients refetch the list instead
+    if len(docs) > EVENTS_MAX_INLINE_DOCS:
+        data = {"count": len(docs), "opportunities": None}
+    else:
+        data = {"count": len(docs), "opportunities": [{k: v for k, v in doc.items() if k not in ("_id", "user_id")} for doc in docs]}
+    await event_bus.publish(user_id, "opportunities.created", data)
+
+async def wait_for_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+@api_router.websocket("/ws")
+async def live_updates(websocket: WebSocket, token: str = ""):
+    """Push channel for the current user; browsers can't set headers on WebSockets, so the JWT comes as ?token=."""
+    try:
+        user = await user_from_token(token)
+    except HTTPException as e:
+        # Accept first: a close before the handshake becomes a 403 and browsers only see code 1006
+        await websocket.accept()
+        await websocket.close(code=4401, reason=e.detail)
+        return
+    
+    await websocket.accept()
+    queue = event_bus.subscribe(user["id"])
+    disconnected = asyncio.create_task(wait_for_disconnect(websocket))
+    getter = None
+    try:
+        await websocket.send_text(orjson.dumps({"type": "ready", "data": {"mode": event_bus.mode}}).decode())
+        while True:
+            if getter is None:
+                getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=WS_PING_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await websocket.send_text(orjson.dumps(getter.result()).decode())
+                getter = None
+            elif disconnected in done:
+                break
+            else:
+                # Keeps idle connections open through proxies
+                await websocket.send_text('{"type":"ping"}')
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        if getter is not None:
+            getter.cancel()
+        event_bus.unsubscribe(user["id"], queue)
+
 # ============== HEALTH CHECK ==============
 
 @api_router.get("/")
@@ -632,17 +2865,48 @@ async def root():
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now(timezone.utc).isoformat()}
 
-# Include the router in the main app
-app.include_router(api_router)
+# ============== APPLICATION ==============
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker after fork: build this process's clients and warm them up
+    started = time.perf_counter()
+    connect_db()
+    dataforseo._client()
+    await client.admin.command("ping")
+    # Index builds are idempotent and not needed to serve traffic, so they don't delay readiness
+    index_task = asyncio.create_task(ensure_indexes())
+    await event_bus.start()
+    logger.info(
+        f"Worker {os.getpid()} ready in {(time.perf_counter() - started) * 1000:.0f} ms "
+        f"(maxPoolSize={MONGO_MAX_POOL_SIZE}, workers={WORKER_COUNT})"
+    )
+    yield
+    if not index_task.done():
+        index_task.cancel()
+    await event_bus.stop()
+    await dataforseo.close()
+    if domain_checker is not None:
+        await domain_checker.resolver.close()
     client.close()
+
+def create_app() -> FastAPI:
+    """Application factory; `server:app` below is the default instance."""
+    application = FastAPI(title="EMD Hunter API", default_response_class=ORJSONResponse, lifespan=lifespan)
+    
+    # Include the router in the main app
+    application.include_router(api_router)
+    
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "Retry-After", "X-Queue-Position", "X-Queue-Wait-Ms"],
+    )
+    
+    application.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+    return application
+
+app = create_app()
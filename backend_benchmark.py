@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+EMD Hunter Backend Benchmarks
+Measures CPU spent on hot backend paths without touching MongoDB or DataForSEO
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "emd_hunter_bench")
+
+import orjson
+import server
+
+def build_serp_payload(keyword, organic=100, features=60):
+    """Build a /serp/google/organic/live/advanced body with realistic SERP feature noise"""
+    items = []
+    for i in range(organic + features):
+        if i % 3 == 1 and features:
+            features -= 1
+            items.append({
+                "type": random.choice(["people_also_ask", "local_pack", "images", "video", "related_searches"]),
+                "rank_group": i,
+                "rank_absolute": i + 1,
+                "items": [{"title": f"{keyword} feature {j}", "url": f"https://feature{j}.example.com/",
+                           "description": "x" * 200, "images": [{"url": f"https://img{k}.example.com"} for k in range(5)]}
+                          for j in range(6)],
+            })
+            continue
+        domain = random.choice(["yelp.com", "bbb.org", "localpros.com", "cityexperts.net", "angi.com"])
+        items.append({
+            "type": "organic",
+            "rank_group": i,
+            "rank_absolute": i + 1,
+            "domain": f"www.{domain}",
+            "url": f"https://www.{domain}/{keyword.replace(' ', '-')}/{i}",
+            "title": f"{keyword.title()} | {domain}",
+            "description": "Licensed and insured local pros. " * 8,
+            "breadcrumb": f"https://www.{domain} › {keyword}",
+            "highlighted": keyword.split(),
+            "links": [{"title": f"Link {j}", "url": f"https://www.{domain}/l/{j}"} for j in range(4)],
+            "rank_info": {"page_rank": 10, "main_domain_rank": random.randint(5, 95)},
+            "backlinks_info": {"referring_domains": 40, "backlinks": random.randint(0, 90000)},
+            "rating": {"rating_type": "Max5", "value": 4.5, "votes_count": 120},
+        })
+    return {
+        "version": "0.1.20250101",
+        "status_code": 20000,
+        "status_message": "Ok.",
+        "cost": 0.002,
+        "tasks": [{
+            "id": "bench",
+            "status_code": 20000,
+            "result": [{"keyword": keyword, "items_count": len(items), "items": items}],
+        }],
+    }
+
+def baseline_extract(raw):
+    """Original analyze_serp path: stdlib json plus chained .get() over every item"""
+    data = json.loads(raw)
+    results = []
+    directory_domains = ['yelp.com', 'bbb.org', 'angieslist.com', 'angi.com', 'yellowpages.com']
+    for task in data.get("tasks", []):
+        for result_item in task.get("result", []):
+            for item in result_item.get("items", []):
+                if item.get("type") != "organic":
+                    continue
+                domain = server.extract_domain(item.get("url", ""))
+                is_directory = any(d in domain.lower() for d in directory_domains)
+                results.append({
+                    "rank": item.get("rank_absolute", 0),
+                    "domain": domain,
+                    "url": item.get("url", ""),
+                    "title": item.get("title", ""),
+                    "description": item.get("description", ""),
+                    "domain_rank": item.get("rank_info", {}).get("main_domain_rank", 0) if item.get("rank_info") else 0,
+                    "backlinks": item.get("backlinks_info", {}).get("backlinks", 0) if item.get("backlinks_info") else 0,
+                    "is_directory": is_directory,
+                    "is_replaceable": is_directory or (item.get("rank_info", {}).get("main_domain_rank", 100) or 100) < 40
+                })
+    results = results[:10]
+    return json.dumps({"results": results}).encode()
+
+def fast_extract(raw):
+    """Current analyze_serp path: orjson decode, early-exit extraction, orjson encode"""
+    rows = server.extract_organic_results(orjson.loads(raw))
+    return orjson.dumps({"results": [row.to_dict() for row in rows]})
+
+def timeit(fn, arg, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(arg)
+    return (time.process_time() - start) / rounds
+
+def bench_serp_json(rounds=300):
+    """CPU per SERP for decode + extract + encode"""
+    raw = json.dumps(build_serp_payload("plumber phoenix")).encode()
+    assert json.loads(baseline_extract(raw))["results"] == orjson.loads(fast_extract(raw))["results"]
+
+    baseline = timeit(baseline_extract, raw, rounds)
+    fast = timeit(fast_extract, raw, rounds)
+    print(f"SERP payload: {len(raw) / 1024:.0f} KiB, {rounds} rounds")
+    print(f"  json + .get() chain : {baseline * 1000:.3f} ms CPU/SERP")
+    print(f"  orjson + extractor  : {fast * 1000:.3f} ms CPU/SERP")
+    print(f"  saved               : {(baseline - fast) * 1000:.3f} ms CPU/SERP ({baseline / fast:.1f}x)")
+
+def bench_row_memory(count=200_000):
+    """Bytes per SERP row held as a dict versus a slotted SerpRow"""
+    template = server.SerpRow(1, "localpros.com", "https://www.localpros.com/", "Plumber Phoenix",
+                              "Licensed and insured", 25, 40, False, True).to_dict()
+
+    def allocated(factory):
+        tracemalloc.start()
+        rows = [factory(i) for i in range(count)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del rows
+        return size / count
+
+    as_dict = allocated(lambda i: {**template, "rank": i})
+    as_row = allocated(lambda i: server.SerpRow(**{**template, "rank": i}))
+    started = time.process_time()
+    rows = [server.SerpRow.from_dict(template) for _ in range(count)]
+    scored = time.process_time()
+    for i in range(0, count, 10):
+        server.calculate_kill_score(rows[i:i + 10], {"keyword": "plumber phoenix", "search_volume": 500, "cpc": 25})
+    done = time.process_time()
+    print(f"SERP rows ({count:,})")
+    print(f"  dict per row        : {as_dict:.0f} B")
+    print(f"  SerpRow per row     : {as_row:.0f} B")
+    print(f"  build + score       : {(scored - started) * 1e6 / count:.2f} + {(done - scored) * 1e6 / count:.2f} us/row")
+
+IMPORT_PROBE = """
+import time
+started = time.perf_counter()
+import server
+print(time.perf_counter() - started)
+"""
+
+READY_PROBE = """
+import asyncio, time
+started = time.perf_counter()
+import server
+async def main():
+    async with server.lifespan(server.app):
+        print(time.perf_counter() - started)
+asyncio.run(main())
+"""
+
+def run_probe(code, timeout=20):
+    """Run a probe in a fresh interpreter, return its printed seconds or None on failure"""
+    try:
+        result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=os.environ,
+                                capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+def bench_cold_start(runs=5):
+    """Fresh-process time to import the app, and to finish lifespan startup (needs MongoDB)"""
+    print(f"Cold start, median of {runs} fresh processes")
+    for label, probe in (("import server", IMPORT_PROBE), ("ready (lifespan)", READY_PROBE)):
+        timings = [run_probe(probe) for _ in range(runs)]
+        if None in timings:
+            print(f"  {label:<20}: skipped (probe failed, is MongoDB reachable at MONGO_URL?)")
+            continue
+        print(f"  {label:<20}: {statistics.median(timings) * 1000:.0f} ms")
+
+def main():
+    random.seed(7)
+    bench_serp_json()
+    bench_row_memory()
+    bench_cold_start()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -66,6 +66,34 @@ class EMDHunterAPITester:
             self.log(f"❌ {name} - Exception: {str(e)}", name)
             return False, {}
 
+    def run_raw_test(self, name, method, endpoint, expected_status, params=None, data=None, files=None, headers=None):
+        """Run an API test that needs the raw response (files, headers, non-JSON bodies)"""
+        url = f"{self.base_url}/api/{endpoint}"
+        test_headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        if headers:
+            test_headers.update(headers)
+
+        self.tests_run += 1
+        self.log(f"🔍 Testing {name}...", name)
+
+        try:
+            if method == 'GET':
+                response = requests.get(url, params=params, headers=test_headers, timeout=60)
+            elif method == 'POST':
+                response = requests.post(url, params=params, json=data, files=files, headers=test_headers, timeout=60)
+
+            if response.status_code == expected_status:
+                self.tests_passed += 1
+                self.log(f"✅ {name} - Status: {response.status_code}")
+                return True, response
+            self.log(f"❌ {name} - Expected {expected_status}, got {response.status_code}", name)
+            self.log(f"   Response: {response.text[:200]}", name)
+            return False, response
+
+        except Exception as e:
+            self.log(f"❌ {name} - Exception: {str(e)}", name)
+            return False, None
+
     def test_health_check(self):
         """Test basic health endpoints"""
         self.log("\n=== HEALTH CHECK TESTS ===")
@@ -203,6 +231,33 @@ class EMDHunterAPITester:
             return True, response
         return False, {}
 
+    def test_serp_batch_clustering(self):
+        """Test that batch clustering only merges near-duplicates, even across repeated batches"""
+        self.log("\n=== SERP BATCH CLUSTERING TEST ===")
+        if not self.token:
+            self.log("❌ No token available for batch clustering")
+            return False
+
+        batch = {
+            "keywords": ["phoenix plumber", "plumbers in phoenix", "mesa plumber", "tempe roofer", "denver dentist"],
+            "location_name": "United States"
+        }
+        # The second run would pick up any cluster aliases the first one recorded
+        for attempt in ("First", "Second"):
+            success, response = self.run_test(f"{attempt} Clustered Batch", "POST", "serp/analyze/batch", 200, data=batch)
+            if not success:
+                return False
+            representatives = {result['keyword']: result.get('representative') for result in response.get('results', [])}
+            if representatives.get("plumbers in phoenix") != representatives.get("phoenix plumber"):
+                self.log(f"❌ Near-duplicates were not clustered: {representatives}", f"{attempt} Clustered Batch")
+                return False
+            unrelated = ["phoenix plumber", "mesa plumber", "tempe roofer", "denver dentist"]
+            if len({representatives.get(keyword) for keyword in unrelated}) != len(unrelated):
+                self.log(f"❌ Unrelated keywords were aliased: {representatives}", f"{attempt} Clustered Batch")
+                return False
+        self.log("✅ Only near-duplicate keywords share a SERP check")
+        return True
+
     def test_ai_analysis(self):
         """Test AI analysis endpoint"""
         self.log("\n=== AI ANALYSIS TEST ===")
@@ -233,6 +288,55 @@ class EMDHunterAPITester:
             return True
         return False
 
+    def test_domain_check(self):
+        """Test domain availability checker"""
+        self.log("\n=== DOMAIN AVAILABILITY TEST ===")
+        if not self.token:
+            self.log("❌ No token available for domain check")
+            return False
+            
+        check_data = {
+            "keywords": ["plumber phoenix"],
+            "tlds": ["com", "net"],
+            "include_hyphenated": True
+        }
+        
+        success, response = self.run_test(
+            "Domain Check",
+            "POST",
+            "domains/check",
+            200,
+            data=check_data
+        )
+        
+        if success and 'results' in response:
+            results = response['results']
+            self.log(f"✅ Domain check returned {len(results)} candidates, {response.get('available')} available")
+            if len(results) != 4:
+                self.log(f"❌ Expected 4 candidates, got {len(results)}", "Domain Check")
+                return False
+            return True
+        return False
+
+    def test_stats(self):
+        """Test dashboard stats endpoint"""
+        self.log("\n=== DASHBOARD STATS TEST ===")
+        if not self.token:
+            self.log("❌ No token available for stats test")
+            return False
+            
+        success, response = self.run_test(
+            "Dashboard Stats",
+            "GET",
+            "stats",
+            200
+        )
+        
+        if success and 'total_opportunities' in response:
+            self.log(f"✅ Stats: {response['total_opportunities']} opportunities, avg Kill Score {response.get('avg_kill_score')}")
+            return True
+        return False
+
     def test_opportunities_crud(self):
         """Test opportunities CRUD operations"""
         self.log("\n=== OPPORTUNITIES CRUD TESTS ===")
@@ -313,6 +417,236 @@ class EMDHunterAPITester:
                 
         return False
 
+    def test_bulk_opportunities(self):
+        """Test bulk create and bulk delete by ids and by filter"""
+        self.log("\n=== BULK OPPORTUNITIES TEST ===")
+        if not self.token:
+            self.log("❌ No token available for bulk tests")
+            return False
+
+        opportunities = [
+            {
+                "keyword": f"bulk test roofer {city}",
+                "location": "United States",
+                "search_volume": 400,
+                "cpc": 18.0,
+                "competition": 0.4,
+                "kill_score": 60,
+                "serp_results": []
+            }
+            for city in ("mesa", "tempe", "chandler")
+        ]
+        success, response = self.run_test(
+            "Bulk Create Opportunities",
+            "POST",
+            "opportunities/bulk",
+            200,
+            data={"opportunities": opportunities}
+        )
+        if not success or response.get('created') != 3:
+            self.log(f"❌ Expected 3 created, got {response.get('created')}", "Bulk Create Opportunities")
+            return False
+        ids = [result['opportunity']['id'] for result in response['results']]
+
+        success, response = self.run_test(
+            "Bulk Delete By Ids",
+            "POST",
+            "opportunities/bulk/delete",
+            200,
+            data={"ids": [ids[0], "does-not-exist"]}
+        )
+        statuses = {result['id']: result['status'] for result in response.get('results', [])}
+        if not success or response.get('deleted') != 1 or statuses != {ids[0]: "deleted", "does-not-exist": "not_found"}:
+            self.log(f"❌ Unexpected delete-by-ids result: {response}", "Bulk Delete By Ids")
+            return False
+
+        success, response = self.run_test(
+            "Bulk Delete By Filter",
+            "POST",
+            "opportunities/bulk/delete",
+            200,
+            data={"filter": {"keyword_contains": "bulk test roofer"}}
+        )
+        if not success or response.get('deleted') != 2:
+            self.log(f"❌ Expected 2 deleted by filter, got {response.get('deleted')}", "Bulk Delete By Filter")
+            return False
+        return True
+
+    def test_import_export(self):
+        """Test an NDJSON export -> import round trip"""
+        self.log("\n=== IMPORT / EXPORT TEST ===")
+        if not self.token:
+            self.log("❌ No token available for import/export tests")
+            return False
+
+        opportunities = [
+            {
+                "keyword": f"roundtrip test dentist {city}",
+                "location": "United States",
+                "search_volume": 300,
+                "cpc": 30.0,
+                "competition": 0.5,
+                "kill_score": 55,
+                "serp_results": [{"rank": 1, "domain": "example.com", "title": "Example"}]
+            }
+            for city in ("austin", "dallas")
+        ]
+        success, _ = self.run_test("Round Trip Setup", "POST", "opportunities/bulk", 200, data={"opportunities": opportunities})
+        if not success:
+            return False
+
+        success, response = self.run_raw_test("Export NDJSON", "GET", "opportunities/export", 200, params={"format": "ndjson"})
+        if not success:
+            return False
+        lines = [line for line in response.text.splitlines() if "roundtrip test dentist" in line]
+        if len(lines) != 2:
+            self.log(f"❌ Expected 2 exported rows, got {len(lines)}", "Export NDJSON")
+            return False
+
+        self.run_test("Round Trip Clear", "POST", "opportunities/bulk/delete", 200,
+                      data={"filter": {"keyword_contains": "roundtrip test dentist"}})
+
+        success, response = self.run_raw_test(
+            "Import NDJSON",
+            "POST",
+            "opportunities/import",
+            200,
+            files={"file": ("opportunities.ndjson", "\n".join(lines).encode(), "application/x-ndjson")}
+        )
+        result = response.json() if success else {}
+        self.run_test("Round Trip Cleanup", "POST", "opportunities/bulk/delete", 200,
+                      data={"filter": {"keyword_contains": "roundtrip test dentist"}})
+        if result.get('inserted') != 2 or result.get('failed') != 0:
+            self.log(f"❌ Unexpected import result: {result}", "Import NDJSON")
+            return False
+        self.log("✅ Export -> import round trip preserved 2 opportunities")
+        return True
+
+    def test_http_caching(self):
+        """Test ETag revalidation and response compression on the opportunities list"""
+        self.log("\n=== HTTP CACHING TEST ===")
+        if not self.token:
+            self.log("❌ No token available for HTTP caching tests")
+            return False
+
+        opportunities = [
+            {
+                "keyword": f"cache test electrician {city}",
+                "location": "United States",
+                "search_volume": 250,
+                "cpc": 15.0,
+                "competition": 0.3,
+                "kill_score": 45,
+                "serp_results": [{"rank": rank, "domain": f"site{rank}.com", "title": f"Electrician {city} {rank}"} for rank in range(1, 11)]
+            }
+            for city in ("austin", "dallas", "houston")
+        ]
+        success, _ = self.run_test("Caching Setup", "POST", "opportunities/bulk", 200, data={"opportunities": opportunities})
+        if not success:
+            return False
+
+        try:
+            success, response = self.run_raw_test(
+                "Compressed Opportunities", "GET", "opportunities", 200, headers={"Accept-Encoding": "gzip"}
+            )
+            if not success:
+                return False
+            if response.headers.get('Content-Encoding') != 'gzip':
+                self.log(f"❌ Expected gzip Content-Encoding, got {response.headers.get('Content-Encoding')}", "Compressed Opportunities")
+                return False
+            etag = response.headers.get('ETag')
+            if not etag:
+                self.log("❌ No ETag on the opportunities list", "Compressed Opportunities")
+                return False
+
+            success, _ = self.run_raw_test("Opportunities Not Modified", "GET", "opportunities", 304, headers={"If-None-Match": etag})
+            if not success:
+                return False
+
+            success, _ = self.run_test("Caching Save", "POST", "opportunities", 200, data={**opportunities[0], "keyword": "cache test electrician plano"})
+            if not success:
+                return False
+            success, _ = self.run_raw_test("Opportunities Changed After Save", "GET", "opportunities", 200, headers={"If-None-Match": etag})
+            if not success:
+                return False
+        finally:
+            self.run_test("Caching Cleanup", "POST", "opportunities/bulk/delete", 200,
+                          data={"filter": {"keyword_contains": "cache test electrician"}})
+        self.log("✅ ETag revalidates until a save and large responses are compressed")
+        return True
+
+    def test_quota_and_scheduling(self):
+        """Test queue headers, /quota usage reporting, and the 429 once a daily quota is used up"""
+        self.log("\n=== QUOTA & SCHEDULING TEST ===")
+        if not self.token:
+            self.log("❌ No token available for quota tests")
+            return False
+
+        success, response = self.run_raw_test(
+            "Queue Headers", "POST", "serp/analyze", 200,
+            data={"keyword": "quota test locksmith", "location_name": "United States"}
+        )
+        if not success:
+            return False
+        missing = [header for header in ('X-Queue-Position', 'X-Queue-Wait-Ms') if header not in response.headers]
+        if missing:
+            self.log(f"❌ Missing headers: {missing}", "Queue Headers")
+            return False
+
+        success, response = self.run_test("Quota Usage", "GET", "quota", 200)
+        if not success:
+            return False
+        if response.get('used', {}).get('serp', 0) < 1 or 'serp' not in response.get('limits', {}):
+            self.log(f"❌ SERP check not reported: {response}", "Quota Usage")
+            return False
+
+        # Use up a throwaway account's SERP quota so the main test user keeps its own
+        own_token = self.token
+        try:
+            email = f"quota-{datetime.now().strftime('%Y%m%d%H%M%S%f')}@test.com"
+            success, response = self.run_test(
+                "Quota User Registration", "POST", "auth/register", 200,
+                data={"email": email, "password": "hunter123", "name": "Quota Hunter"}
+            )
+            if not success:
+                return False
+            self.token = response['access_token']
+
+            _, quota = self.run_test("Quota Limits", "GET", "quota", 200)
+            limit = quota.get('limits', {}).get('serp')
+            if not limit or limit > 2000:
+                self.log(f"ℹ️  SERP quota is {limit or 'unlimited'}; skipping the exhaustion check")
+                return True
+
+            # Batches without clustering charge one SERP check per keyword
+            remaining = limit - quota.get('used', {}).get('serp', 0)
+            batch_number = 0
+            while remaining > 0:
+                size = min(100, remaining)
+                keywords = [f"quota probe {batch_number} {i}" for i in range(size)]
+                success, _ = self.run_test(
+                    f"Quota Batch {batch_number + 1}", "POST", "serp/analyze/batch", 200,
+                    data={"keywords": keywords, "cluster": False}
+                )
+                if not success:
+                    return False
+                remaining -= size
+                batch_number += 1
+
+            success, response = self.run_raw_test(
+                "Quota Exceeded", "POST", "serp/analyze", 429,
+                data={"keyword": "quota test locksmith", "location_name": "United States"}
+            )
+            if not success:
+                return False
+            if not response.headers.get('Retry-After', '').isdigit():
+                self.log(f"❌ Missing Retry-After: {dict(response.headers)}", "Quota Exceeded")
+                return False
+        finally:
+            self.token = own_token
+        self.log("✅ Queue headers, quota usage and the quota limit all reported")
+        return True
+
     def run_all_tests(self):
         """Run complete test suite"""
         self.log("🚀 Starting EMD Hunter API Test Suite")
@@ -333,8 +667,15 @@ class EMDHunterAPITester:
             # Core functionality tests
             self.test_keyword_search()
             self.test_serp_analysis()
+            self.test_serp_batch_clustering()
             self.test_ai_analysis()
+            self.test_domain_check()
             self.test_opportunities_crud()
+            self.test_bulk_opportunities()
+            self.test_import_export()
+            self.test_http_caching()
+            self.test_quota_and_scheduling()
+            self.test_stats()
         else:
             self.log("❌ Authentication failed - skipping protected endpoint tests")
         
@@ -0,0 +1,89 @@
+import { useEffect, useRef } from 'react';
+import { useAuth } from '../context/AuthContext';
+
+const API_URL = process.env.REACT_APP_BACKEND_URL;
+const RECONNECT_DELAY_MS = 3000;
+// Give up after this many connections in a row that never opened
+const MAX_FAILED_CONNECTS = 5;
+
+// Subscribes to /api/ws and calls onEvent for every pushed event ({ type, data, at }).
+// Reconnects after drops; stops when the token is rejected or the server keeps refusing
+// the handshake, and closes when the component unmounts or the user logs out.
+export const useLiveUpdates = (onEvent) => {
+  const { token } = useAuth();
+  const handlerRef = useRef(onEvent);
+  handlerRef.current = onEvent;
+
+  useEffect(() => {
+    if (!token || !API_URL) return undefined;
+
+    let socket = null;
+    let retryTimer = null;
+    let closed = false;
+    let failedConnects = 0;
+
+    const connect = () => {
+      let opened = false;
+      socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/api/ws?token=${encodeURIComponent(token)}`);
+      socket.onopen = () => {
+        opened = true;
+        failedConnects = 0;
+      };
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type !== 'ping' && event.type !== 'ready') {
+          handlerRef.current(event);
+        }
+      };
+      socket.onclose = (event) => {
+        failedConnects = opened ? 0 : failedConnects + 1;
+        // 4401: token rejected, retrying won't help
+        if (!closed && event.code !== 4401 && failedConnects < MAX_FAILED_CONNECTS) {
+          retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
+    };
+  }, [token]);
+};
+
+// Applies an opportunity event to a list of opportunities (newest first).
+// Large imports only carry a count; callers refetch for those.
+export const applyOpportunityEvent = (opportunities, event) => {
+  switch (event.type) {
+    case 'opportunities.created': {
+      if (!event.data.opportunities) return opportunities;
+      const known = new Set(opportunities.map((o) => o.id));
+      const added = event.data.opportunities.filter((o) => !known.has(o.id));
+      return [...added.reverse(), ...opportunities];
+    }
+    case 'opportunities.deleted': {
+      const removed = new Set(event.data.ids);
+      return opportunities.filter((o) => !removed.has(o.id));
+    }
+    case 'opportunity.rescored':
+      return opportunities.map((o) => (o.id === event.data.id ? { ...o, ...event.data } : o));
+    default:
+      return opportunities;
+  }
+};
+
+// Keeps a page's opportunity list in sync with opportunity.* events. Large imports only
+// carry a count, so those call refetch instead; onChange runs after every opportunity event.
+export const useLiveOpportunities = (setOpportunities, refetch, onChange) => {
+  useLiveUpdates((event) => {
+    if (!event.type.startsWith('opportunit')) return;
+    if (event.type === 'opportunities.created' && !event.data.opportunities) {
+      refetch();
+    } else {
+      setOpportunities((current) => applyOpportunityEvent(current, event));
+    }
+    if (onChange) onChange(event);
+  });
+};
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { useAuth } from '../context/AuthContext';
+import { useLiveOpportunities } from '../hooks/use-live-updates';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
@@ -16,12 +17,28 @@ const Dashboard = () => {
   const navigate = useNavigate();
   const { user, logout, getAuthHeaders } = useAuth();
   const [opportunities, setOpportunities] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
     fetchOpportunities();
+    fetchStats();
   }, []);
 
+  const fetchStats = async () => {
+    try {
+      const response = await axios.get(`${API_URL}/api/stats`, {
+        headers: getAuthHeaders()
+      });
+      setStats(response.data);
+    } catch (error) {
+      console.error('Failed to fetch stats:', error);
+    }
+  };
+
+  // Other tabs and background jobs push changes here instead of us refetching
+  useLiveOpportunities(setOpportunities, () => fetchOpportunities(), () => fetchStats());
+
   const fetchOpportunities = async () => {
     try {
       const response = await axios.get(`${API_URL}/api/opportunities`, {
@@ -128,6 +145,28 @@ const Dashboard = () => {
           </p>
         </motion.div>
 
+        {/* Portfolio Stats */}
+        {stats && stats.total_opportunities > 0 && (
+          <div className="grid grid-cols-2 md:grid-cols-4 gap-4 mb-8" data-testid="dashboard-stats">
+            {[
+              { label: 'Opportunities', value: stats.total_opportunities },
+              { label: 'Avg Kill Score', value: stats.avg_kill_score },
+              { label: 'Avg CPC', value: `$${stats.avg_cpc}` },
+              { label: 'Top Location', value: stats.top_locations[0]?.location || '-' }
+            ].map((stat, i) => (
+              <Card key={i} className="bg-card border-border/50">
+                <CardContent className="p-4">
+                  <div className="flex items-center gap-2 text-xs text-muted-foreground mb-1">
+                    <TrendingUp className="w-3 h-3" />
+                    {stat.label}
+                  </div>
+                  <div className="text-2xl font-bold font-mono text-primary truncate">{stat.value}</div>
+                </CardContent>
+              </Card>
+            ))}
+          </div>
+        )}
+
         {/* Quick Actions */}
         <div className="grid md:grid-cols-3 gap-6 mb-12">
           {quickActions.map((action, i) => (
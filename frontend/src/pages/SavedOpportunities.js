@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
 import { useAuth } from '../context/AuthContext';
+import { useLiveOpportunities } from '../hooks/use-live-updates';
 import axios from 'axios';
 import { Button } from '../components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
@@ -23,6 +24,9 @@ const SavedOpportunities = () => {
     fetchOpportunities();
   }, []);
 
+  // Other tabs and background jobs push changes here instead of us refetching
+  useLiveOpportunities(setOpportunities, () => fetchOpportunities());
+
   const fetchOpportunities = async () => {
     try {
       const response = await axios.get(`${API_URL}/api/opportunities`, {